@@ -1,17 +1,156 @@
-from fastapi import APIRouter, UploadFile, File, Request
-from fastapi.responses import JSONResponse
+import time
+import json
+import asyncio
+import zipfile
+from fastapi import APIRouter, UploadFile, File, Form, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from app.services.image_preprocess import prepare_image_async
+from app.services.prescription_pipeline import analysis_key, analyze_contents, archive_members, is_archive, run_batch
+from app.services.upload_stream import UploadLimits, UploadRejected, read_upload
 
 router = APIRouter()
 
+def cache_bypassed(request: Request) -> bool:
+    if request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @router.post("/analyze-prescription")
 async def analyze_prescription(request: Request, file: UploadFile = File(...)):
     ai_client = getattr(request.app.state, "ai_client", None)
     if not ai_client:
         return JSONResponse(status_code=500, content={"error": "AI Client not initialized"})
+    upload = None
     try:
-        contents = await file.read()
-        analysis = ai_client.analyze_prescription(contents)
-        extracted_data = ai_client.extract_patient_info(analysis, {})
-        return {"analysis": analysis, "extracted_data": extracted_data}
+        upload = await read_upload(file)
+        cache = getattr(request.app.state, "analysis_cache", None)
+        result, status = await analyze_contents(ai_client, upload, cache, bypass=cache_bypassed(request))
+        return JSONResponse(content=result, headers={"X-Cache": status})
+    except UploadRejected as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
\ No newline at end of file
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    finally:
+        if upload is not None:
+            upload.close()
+
+@router.post("/analyze-prescription/batch")
+async def analyze_prescription_batch(
+    request: Request,
+    files: list[UploadFile] = File(...),
+    skip: str = Form(""),
+):
+    """Many images (or ZIP archives of images) in, one NDJSON line per image out as each finishes.
+
+    ``skip`` is a comma-separated list of SHA-256 digests already processed by an earlier attempt.
+    """
+    ai_client = getattr(request.app.state, "ai_client", None)
+    if not ai_client:
+        return JSONResponse(status_code=500, content={"error": "AI Client not initialized"})
+    limits = UploadLimits.from_env()
+    items = []
+    for upload in files:
+        head = await upload.read(4)
+        await upload.seek(0)
+        if is_archive(upload.filename, head):
+            try:
+                # Opened in place: the spooled archive is never loaded whole, only its members one by one.
+                items.extend(archive_members(upload.file, limits))
+            except zipfile.BadZipFile:
+                return JSONResponse(status_code=400, content={"error": f"{upload.filename} is not a valid ZIP archive"})
+        else:
+            items.append((upload.filename, lambda u=upload: read_upload(u, limits)))
+    cache = getattr(request.app.state, "analysis_cache", None)
+    digests = [d.strip() for d in skip.split(",") if d.strip()]
+
+    async def lines():
+        async for line in run_batch(ai_client, items, cache, skip=digests, bypass=cache_bypassed(request)):
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/analyze-prescription/stream")
+async def analyze_prescription_stream(request: Request, file: UploadFile = File(...)):
+    """Server-sent events: ``token`` chunks of the Markdown analysis, then one ``result``."""
+    ai_client = getattr(request.app.state, "ai_client", None)
+    if not ai_client:
+        return JSONResponse(status_code=500, content={"error": "AI Client not initialized"})
+    try:
+        upload = await read_upload(file)
+    except UploadRejected as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
+    cache = getattr(request.app.state, "analysis_cache", None)
+    key = analysis_key(upload, ai_client)
+    bypass = cache_bypassed(request)
+
+    tokens = asyncio.Queue()
+    work = None
+
+    async def compute():
+        image = await prepare_image_async(upload.source)
+        started = time.perf_counter()
+        first_token_ms = None
+        parts = []
+        async for piece in ai_client.astream_prescription(image):
+            if first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 2)
+            parts.append(piece)
+            tokens.put_nowait(piece)
+        analysis = "".join(parts)
+        extracted_data = await ai_client.aextract_patient_info(analysis, {})
+        return {
+            "analysis": analysis,
+            "extracted_data": extracted_data,
+            "preprocess": image.stats,
+            "llm": {"mode": "stream", "ms": round((time.perf_counter() - started) * 1000, 2), "first_token_ms": first_token_ms},
+            "upload": upload.stats(),
+        }
+
+    async def uncached():
+        return await compute(), "DISABLED"
+
+    def release(task=None):
+        # The spooled upload stays until the analysis lands, even when the client has gone.
+        if task is not None and not task.cancelled():
+            task.exception()
+        if work is None or work.done():
+            upload.close()
+
+    async def events():
+        nonlocal work
+        # Identical uploads share one analysis; only the request that runs it gets live tokens.
+        work = asyncio.ensure_future(cache.get_or_compute(key, compute, bypass=bypass) if cache is not None else uncached())
+        work.add_done_callback(release)
+        try:
+            streamed = False
+            while True:
+                getter = asyncio.ensure_future(tokens.get())
+                await asyncio.wait((getter, work), return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                streamed = True
+                yield sse("token", {"text": getter.result()})
+            while not tokens.empty():
+                yield sse("token", {"text": tokens.get_nowait()})
+            result, _ = work.result()
+            if not streamed:
+                yield sse("token", {"text": result["analysis"]})
+            yield sse("result", result)
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+        finally:
+            release()
+
+    # ``background`` covers a client that leaves before the generator starts.
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(release))
+
+@router.get("/analyze-prescription/cache-stats")
+async def analysis_cache_stats(request: Request):
+    cache = getattr(request.app.state, "analysis_cache", None)
+    return cache.stats() if cache else {}
@@ -1,12 +1,50 @@
 from fastapi import APIRouter, Request
-from fastapi.responses import Response
-from app.services.pdf_service import generate_pdf
+from fastapi.responses import Response, JSONResponse, StreamingResponse
+from app.services.pdf_service import render_pdf_async, stream_reports_zip, report_timestamp
+from app.services.report_cache import record_key, ReportCache
 
 router = APIRouter()
 
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
 @router.post("/generate-report")
 async def generate_report(request: Request):
     body = await request.json()
-    pdf_bytes = generate_pdf(body)
-    headers = {"Content-Disposition": "attachment; filename=medical_report.pdf"}
-    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
\ No newline at end of file
+    cache = getattr(request.app.state, "report_cache", None)
+    if cache is None:
+        pdf_bytes = await render_pdf_async(body)
+        headers = {"Content-Disposition": "attachment; filename=medical_report.pdf"}
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+    key = record_key(body)
+    entry = cache.get(key)
+    status = "HIT"
+    if entry is None:
+        status = "MISS"
+        generated_at = cache.pin(key, report_timestamp(body))
+        pdf_bytes = await render_pdf_async(body, generated_at)
+        entry = cache.put(key, ReportCache.etag(key, generated_at), pdf_bytes)
+    etag, pdf_bytes = entry
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Cache": status}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    headers["Content-Disposition"] = "attachment; filename=medical_report.pdf"
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+@router.get("/generate-report/cache-stats")
+async def report_cache_stats(request: Request):
+    cache = getattr(request.app.state, "report_cache", None)
+    return cache.stats() if cache else {}
+
+@router.post("/generate-report/batch")
+async def generate_report_batch(request: Request):
+    body = await request.json()
+    records = body.get("records") if isinstance(body, dict) else body
+    if not isinstance(records, list) or not records or not all(isinstance(r, dict) for r in records):
+        return JSONResponse(status_code=400, content={"error": "Expected a non-empty list of patient records"})
+    headers = {"Content-Disposition": "attachment; filename=medical_reports.zip"}
+    return StreamingResponse(stream_reports_zip(records), media_type="application/zip", headers=headers)
@@ -1,10 +1,36 @@
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import Response, PlainTextResponse
+from app.services.metrics import REGISTRY
+from app.services.static_page import StaticPage, choose_encoding
 
 router = APIRouter()
 
 @router.get("/")
-async def get():
-    with open("templates/index.html", "r", encoding="utf-8") as f:
-        html_content = f.read()
-    return HTMLResponse(content=html_content, status_code=200)
\ No newline at end of file
+async def get(request: Request):
+    page = getattr(request.app.state, "index_page", None)
+    if page is None:
+        page = request.app.state.index_page = StaticPage.from_env()
+    version = await page.current()
+    headers = {
+        "ETag": version.etag,
+        "Last-Modified": version.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if version.not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        page.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding"), version.bodies)
+    page.count(encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=version.bodies[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+@router.get("/llm-scheduler/stats")
+async def llm_scheduler_stats(request: Request):
+    ai_client = getattr(request.app.state, "ai_client", None)
+    return ai_client.scheduler.stats() if ai_client else {}
+
+@router.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -1,10 +1,45 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import asyncio
 import json
-from app.services.fast_extract import quick_extract
+import uuid
+import asyncio
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from app.services.fast_extract import GATE, quick_extract_scored
+from app.services.extraction_scheduler import ExtractionScheduler
+from app.services.transcript_segments import SegmentTracker
+from app.services.metrics import REGISTRY, stage
+from app.services.wire import dumps
 
 router = APIRouter()
 
+REGISTRY.register_stats("ai_tasks", lambda: {"pending": ExtractionScheduler.pending_total()})
+REGISTRY.register_stats("extraction_gate", GATE.stats)
+
+# Extractions left running by clients that disconnected; held so they are not garbage collected.
+_draining = set()
+
+
+async def _finish(store, session, scheduler):
+    try:
+        await scheduler.drain()
+    finally:
+        await store.release(session)
+
+# Connect with ?session=<id>&v=<version the client holds> to resume a consultation.
+# Server -> client:
+#   SESSION:{"id": session id, "v": server version}  first frame; followed by the PATCHes the client
+#     missed since its version, or a SNAPSHOT when they are no longer in the log
+#   PATCH:{"v": version, "base": previous version, "src": "fast"|"ai", "set": partial record}
+#   SNAPSHOT:{"v": version, "record": full record}
+#   CHAT_DELTA:<text chunk>  streamed assistant reply, then CHAT_DONE:{"reply": full text}
+#   INTERIM:{"id": segment id, "set": provisional fields, "reset": bool}  not part of the record;
+#     "reset" means the recogniser revised the segment and earlier provisional fields are void
+#   FINAL:{"id": segment id}  the segment's PATCH (if any) was sent; drop its provisional fields
+# Client -> server:
+#   RESYNC:<version the client holds>  when a PATCH base does not match it
+#   CHAT:<question>  ask the assistant; the reply streams back as CHAT_DELTA while transcripts keep flowing
+#   SEG:{"id": segment id, "text": transcript so far, "final": bool}  speech-recognition result;
+#     interim ones only get rule matches on the appended text, the final one is a transcript
+#   anything else is a transcript; it only reaches the LLM when the rules did not explain it
+
 @router.websocket("/ws/voice-assistant")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -13,23 +48,133 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.send_text("Error: AI Client not initialized. Please check server logs.")
         await websocket.close()
         return
+    store = websocket.app.state.session_store
+    session_id = websocket.query_params.get("session") or uuid.uuid4().hex
     try:
-        patient_record = {}
-        while True:
-            data = await websocket.receive_text()
+        client_version = int(websocket.query_params.get("v") or 0)
+    except ValueError:
+        client_version = 0
+    session = await store.open(session_id)
+    record = session.record
+
+    async def send_snapshot():
+        await websocket.send_text("SNAPSHOT:" + dumps({"v": record.version, "record": record.to_dict()}))
+
+    async def send_patch(src, **extra):
+        base, version, patch = record.take_delta()
+        if patch:
+            # Logged before sending so a patch lost with the connection is replayed on resume.
+            store.record_patch(session, base, version, src, patch)
+            await websocket.send_text("PATCH:" + dumps({"v": version, "base": base, "src": src, "set": patch, **extra}))
+
+    async def on_update(seq, data):
+        record.merge(data or {})
+        try:
+            await send_patch("ai", seq=seq)
+        except Exception:
+            pass
+
+    async def stream_chat(text):
+        # One reply at a time, in the order asked; the receive loop never waits on it.
+        async with chat_lock:
+            parts = []
             try:
-                fast = quick_extract(data, patient_record)
-                patient_record = {**patient_record, **fast}
-                await websocket.send_text("PRIORITY_UPDATE:" + json.dumps(fast))
+                async for piece in ai_client.astream_chat_response(text, session_id):
+                    parts.append(piece)
+                    await websocket.send_text("CHAT_DELTA:" + piece)
+                await websocket.send_text("CHAT_DONE:" + dumps({"reply": "".join(parts)}))
+            except WebSocketDisconnect:
+                return
             except Exception:
-                pass
-            async def ai_task(t):
                 try:
-                    res = ai_client.extract_patient_info(t, patient_record)
-                    patient_record.update(res or {})
-                    await websocket.send_text("DATA_UPDATE:" + json.dumps(patient_record))
+                    await websocket.send_text("Error: assistant reply failed.")
                 except Exception:
                     pass
-            asyncio.create_task(ai_task(data))
+
+    def start_chat(text):
+        task = asyncio.create_task(stream_chat(text))
+        chats.add(task)
+        task.add_done_callback(chats.discard)
+
+    async def transcript(text, **extra):
+        needs_llm = True
+        try:
+            with stage("quick_extract"):
+                _, coverage = quick_extract_scored(text, record)
+            await send_patch("fast", **extra)
+            needs_llm = GATE.needs_llm(coverage)
+        except Exception:
+            pass
+        if needs_llm:
+            scheduler.submit(text)
+
+    async def segment(msg):
+        seg_id = msg.get("id")
+        text = msg.get("text") or ""
+        # Ids key the segment table and text is scanned; anything else is a malformed frame.
+        if not isinstance(text, str) or not isinstance(seg_id, (str, int)) or isinstance(seg_id, bool):
+            return
+        if msg.get("final"):
+            segments.finish(seg_id)
+            await transcript(text, seg=seg_id)
+            await websocket.send_text("FINAL:" + dumps({"id": seg_id}))
+            return
+        provisional, reset = segments.interim_update(seg_id, text)
+        if provisional or reset:
+            await websocket.send_text("INTERIM:" + dumps({"id": seg_id, "set": provisional, "reset": reset}))
+
+    scheduler = ExtractionScheduler(ai_client.aextract_fields, on_update)
+    chat_lock = asyncio.Lock()
+    chats = set()
+    segments = SegmentTracker()
+    try:
+        await websocket.send_text("SESSION:" + dumps({"id": session_id, "v": record.version}))
+        missed = store.replay(session, client_version)
+        if missed is None:
+            await send_snapshot()
+        for delta in missed or ():
+            await websocket.send_text("PATCH:" + dumps(delta))
+        while True:
+            data = await websocket.receive_text()
+            if data.startswith("RESYNC:"):
+                await send_snapshot()
+                continue
+            if data.startswith("CHAT:"):
+                start_chat(data[5:])
+                continue
+            if data.startswith("SEG:"):
+                try:
+                    msg = json.loads(data[4:])
+                except ValueError:
+                    continue
+                if isinstance(msg, dict):
+                    await segment(msg)
+                continue
+            await transcript(data)
     except WebSocketDisconnect:
         pass
+    finally:
+        for task in list(chats):
+            task.cancel()
+        if scheduler.pending:
+            # Let queued extraction land in the record; its PATCH is logged for the client's resume.
+            task = asyncio.create_task(_finish(store, session, scheduler))
+            _draining.add(task)
+            task.add_done_callback(_draining.discard)
+        else:
+            await scheduler.close()
+            await store.release(session)
+
+@router.get("/chat-sessions/stats")
+async def chat_session_stats(request: Request):
+    ai_client = getattr(request.app.state, "ai_client", None)
+    return ai_client.chat_sessions.stats() if ai_client else {}
+
+@router.get("/voice-sessions/stats")
+async def voice_session_stats(request: Request):
+    store = getattr(request.app.state, "session_store", None)
+    return store.stats() if store else {}
+
+@router.get("/extraction-gate/stats")
+async def extraction_gate_stats():
+    return GATE.stats()
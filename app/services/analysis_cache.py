@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def _retrieve_exception(task: asyncio.Task):
+    # Every waiter may have left; keep an unobserved failure from logging "exception was never retrieved".
+    if not task.cancelled():
+        task.exception()
+
+
+class AnalysisCache:
+    """Two-tier cache for prescription analysis results keyed by content hash.
+
+    The memory tier is an LRU bounded by ``max_entries``; the SQLite tier at
+    ``path`` (off unless ``ANALYSIS_CACHE_PATH`` is set) survives restarts.
+    Both honour ``ttl`` seconds. Concurrent lookups for a key that is already
+    being computed wait on the same task instead of starting another upstream
+    call, and that task finishes even if the caller that started it leaves.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 7 * 24 * 3600, path: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM analysis_cache WHERE expires < ?", (time.time(),))
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "AnalysisCache":
+        return cls(
+            max_entries=int(os.getenv("ANALYSIS_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600))),
+            path=os.getenv("ANALYSIS_CACHE_PATH") or None,
+        )
+
+    @staticmethod
+    def make_key(data: bytes, *parts) -> str:
+        return AnalysisCache.key_from_digest(hashlib.sha256(data), *parts)
+
+    @staticmethod
+    def key_from_digest(digest, *parts) -> str:
+        """``make_key`` for data already hashed into a running ``hashlib.sha256`` object."""
+        digest = digest.copy()
+        for part in parts:
+            digest.update(b"\0" + str(part).encode())
+        return digest.hexdigest()
+
+    def _get_memory(self, key: str):
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _put_memory(self, key: str, value, expires: float):
+        self._memory[key] = (expires, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _get_disk(self, key: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _put_disk(self, key: str, value, expires: float):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires),
+            )
+            self._db.commit()
+
+    async def get(self, key: str):
+        value = self._get_memory(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self._db is not None:
+            row = await asyncio.to_thread(self._get_disk, key)
+            if row is not None:
+                value, expires = row
+                self._put_memory(key, value, expires)
+                self.disk_hits += 1
+                return value
+        return None
+
+    async def put(self, key: str, value):
+        expires = time.time() + self.ttl
+        self._put_memory(key, value, expires)
+        if self._db is not None:
+            await asyncio.to_thread(self._put_disk, key, value, expires)
+
+    async def get_or_compute(self, key: str, compute, bypass: bool = False):
+        """Return ``(value, status)`` where status is HIT, MISS, COALESCED or BYPASS."""
+        if not bypass:
+            value = await self.get(key)
+            if value is not None:
+                return value, "HIT"
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            status = "COALESCED"
+        else:
+            if bypass:
+                self.bypassed += 1
+            else:
+                self.misses += 1
+            status = "BYPASS" if bypass else "MISS"
+            # Its own task: a requester that disconnects must not cancel the work the others wait on.
+            pending = self._inflight[key] = asyncio.ensure_future(self._compute(key, compute))
+            pending.add_done_callback(_retrieve_exception)
+        return await asyncio.shield(pending), status
+
+    async def _compute(self, key: str, compute):
+        try:
+            value = await compute()
+            await self.put(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
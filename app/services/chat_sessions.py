@@ -0,0 +1,145 @@
+import os
+import time
+from collections import OrderedDict
+
+# Floor for a truncated question when the system prompt and reply reserve leave no room.
+MIN_USER_TOKENS = 16
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly four characters per token plus per-message framing; close enough for budgeting.
+    return len(text) // 4 + 4
+
+
+class ChatSession:
+    __slots__ = ("turns", "tokens", "chars", "dropped", "last_used")
+
+    def __init__(self):
+        self.turns = []
+        self.tokens = 0
+        self.chars = 0
+        self.dropped = 0
+        self.last_used = time.monotonic()
+
+
+class ChatSessionStore:
+    """Chat histories keyed by session ID.
+
+    At most ``max_sessions`` are kept (least recently used evicted first) and
+    idle ones expire after ``ttl`` seconds. Each session's history is trimmed
+    from the oldest exchange so system prompt + history + new message + the
+    reply reserve stay within ``token_budget`` estimated tokens; the newest
+    question is always kept, truncated if it cannot fit on its own.
+    """
+
+    def __init__(self, system_prompt: str, max_sessions: int = 1000, ttl: float = 3600, token_budget: int = 3000):
+        self.system_prompt = system_prompt
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.token_budget = token_budget
+        self.evicted = 0
+        self.truncated = 0
+        self._sessions = OrderedDict()
+        self._tokens = 0
+        self._chars = 0
+
+    @classmethod
+    def from_env(cls, system_prompt: str) -> "ChatSessionStore":
+        return cls(
+            system_prompt,
+            max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "1000")),
+            ttl=float(os.getenv("CHAT_SESSION_TTL", "3600")),
+            token_budget=int(os.getenv("CHAT_TOKEN_BUDGET", "3000")),
+        )
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._tokens -= session.tokens
+        self._chars -= session.chars
+        self.evicted += 1
+
+    def _evict(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and session.last_used >= cutoff:
+                break
+            self._drop(session_id)
+
+    def get(self, session_id: str) -> ChatSession:
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = ChatSession()
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_used = time.monotonic()
+        self._evict()
+        return session
+
+    def append(self, session_id: str, role: str, content: str):
+        session = self.get(session_id)
+        tokens = estimate_tokens(content)
+        session.turns.append({"role": role, "content": content})
+        session.tokens += tokens
+        session.chars += len(content)
+        self._tokens += tokens
+        self._chars += len(content)
+        self._trim(session)
+
+    def _remove(self, session: ChatSession, count: int):
+        for turn in session.turns[:count]:
+            tokens = estimate_tokens(turn["content"])
+            session.tokens -= tokens
+            session.chars -= len(turn["content"])
+            self._tokens -= tokens
+            self._chars -= len(turn["content"])
+        del session.turns[:count]
+        session.dropped += count
+        self.truncated += count
+
+    def _trim(self, session: ChatSession, reserve: int = 0):
+        """Drop whole exchanges (a user turn and the replies to it) from the front, never the newest one."""
+        budget = self.token_budget - estimate_tokens(self.system_prompt) - reserve
+        turns = session.turns
+        while session.tokens > budget:
+            end = 1
+            while end < len(turns) and turns[end]["role"] != "user":
+                end += 1
+            if end >= len(turns):
+                break
+            self._remove(session, end)
+        if session.tokens > budget and len(turns) == 1 and turns[0]["role"] == "user":
+            # A lone oversized question is cut down rather than dropped.
+            content = turns[0]["content"]
+            kept = content[:max(budget - 4, MIN_USER_TOKENS) * 4]
+            tokens = estimate_tokens(content) - estimate_tokens(kept)
+            turns[0] = {"role": "user", "content": kept}
+            session.tokens -= tokens
+            session.chars -= len(content) - len(kept)
+            self._tokens -= tokens
+            self._chars -= len(content) - len(kept)
+            self.truncated += 1
+
+    def messages(self, session_id: str, text: str, reserve: int = 0) -> list:
+        """Record the user's turn and return the bounded prompt for it, leaving ``reserve`` tokens for the reply."""
+        self.append(session_id, "user", text)
+        session = self.get(session_id)
+        self._trim(session, reserve)
+        return [{"role": "system", "content": self.system_prompt}] + list(session.turns)
+
+    def clear(self, session_id: str):
+        if session_id in self._sessions:
+            self._drop(session_id)
+            self.evicted -= 1
+
+    def stats(self) -> dict:
+        self._evict()
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "token_budget": self.token_budget,
+            "resident_tokens": self._tokens,
+            "resident_chars": self._chars,
+            "evicted_sessions": self.evicted,
+            "truncated_turns": self.truncated,
+        }
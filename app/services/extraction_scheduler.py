@@ -0,0 +1,133 @@
+import asyncio
+import weakref
+
+
+class ExtractionScheduler:
+    """Per-connection debounce/coalesce queue in front of the LLM extractor.
+
+    Utterances arriving within ``debounce`` seconds are joined into one call.
+    A newer flush cancels a call that is still waiting on the model and folds
+    its text into the new batch (up to ``max_batch`` utterances), so at most
+    one extraction is outstanding per session and every emitted update
+    carries a strictly increasing ``seq``. Text queued behind a call is held to
+    ``max_batch`` entries and ``max_chars`` characters, oldest text dropped
+    first, so a busy session cannot build an unbounded prompt.
+    """
+
+    # Every open connection's scheduler, for the pending-task gauge.
+    live = weakref.WeakSet()
+
+    def __init__(self, extract, on_update, debounce: float = 0.4, max_batch: int = 8, max_chars: int = 4000):
+        self.extract = extract
+        self.on_update = on_update
+        self.debounce = debounce
+        self.max_batch = max_batch
+        self.max_chars = max_chars
+        self.dropped_chars = 0
+        self.seq = 0
+        self.calls = 0
+        self.cancelled = 0
+        self.utterances = 0
+        self._pending = []
+        self._inflight = []
+        self._timer = None
+        self._task = None
+        ExtractionScheduler.live.add(self)
+
+    def submit(self, text: str):
+        self.utterances += 1
+        self._pending.append(text)
+        self._bound()
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        else:
+            self._timer = asyncio.get_running_loop().call_later(self.debounce, self._flush)
+
+    def _bound(self):
+        pending = self._pending
+        if len(pending) > self.max_batch:
+            pending[:2] = [pending[0] + " " + pending[1]]
+        excess = sum(map(len, pending)) - self.max_chars
+        while excess > 0:
+            if len(pending) > 1 and len(pending[0]) <= excess:
+                excess -= len(pending[0])
+                self.dropped_chars += len(pending.pop(0))
+            else:
+                pending[0] = pending[0][excess:]
+                self.dropped_chars += excess
+                excess = 0
+
+    def _flush(self):
+        self._timer = None
+        if not self._pending:
+            return
+        texts = self._pending
+        if self._inflight and self._task and not self._task.done():
+            if len(self._inflight) + len(texts) > self.max_batch:
+                # Too much to fold in; the running call flushes again when it lands.
+                return
+            self._task.cancel()
+            self.cancelled += 1
+            texts = self._inflight + texts
+        self._pending = []
+        self._inflight = texts
+        self._task = asyncio.create_task(self._run(texts))
+
+    async def _run(self, texts: list):
+        self.calls += 1
+        try:
+            result = await self.extract(" ".join(texts))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if self._inflight is texts:
+                self._inflight = []
+            if self._pending and not self._timer:
+                self._flush()
+            return
+        self._inflight = []
+        self.seq += 1
+        await self.on_update(self.seq, result)
+        if self._pending and not self._timer:
+            self._flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    @classmethod
+    def pending_total(cls) -> int:
+        return sum(s.pending for s in list(cls.live))
+
+    async def drain(self, timeout: float = 30.0):
+        """Run what is still queued and wait for it to land, then close; gives up after ``timeout`` seconds."""
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._flush()
+        try:
+            await asyncio.wait_for(self._settle(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            await self.close()
+
+    async def _settle(self):
+        # A landing call flushes anything left behind it, so follow ``_task`` until it stops moving.
+        while self._task is not None and not self._task.done():
+            await asyncio.wait([self._task])
+
+    async def close(self):
+        ExtractionScheduler.live.discard(self)
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
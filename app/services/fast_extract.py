@@ -1,4 +1,7 @@
+import os
 import re
+from app.services.lexicon import MIN_FUZZY_LEN, get_lexicon, read_entries
+from app.services.patient_record import PatientRecord
 
 SYMPTOM_WORDS = [
     "fever", "cough", "cold", "pain", "headache", "vomit", "nausea",
@@ -8,70 +11,382 @@ TEST_WORDS = [
     "cbc", "blood test", "x-ray", "mri", "ct", "urine test", "ecg",
     "lipid profile", "lft", "kft", "thyroid", "vitamin d", "rtpcr"
 ]
+# Inflected or alternate spellings mapped onto the canonical vocabulary entry.
+SYMPTOM_ALIASES = {
+    "fevers": "fever", "coughing": "cough", "headaches": "headache",
+    "vomiting": "vomit", "vomits": "vomit", "tired": "fatigue", "diarrhoea": "diarrhea"
+}
+TEST_ALIASES = {
+    "xray": "x-ray", "x ray": "x-ray", "ct scan": "ct", "rt-pcr": "rtpcr", "blood tests": "blood test"
+}
 
 MED_MARKERS = [
-    r"\bmg\b", r"\bml\b", r"\btablet\b", r"\btabs?\b", r"\bcapsules?\b",
-    r"\bonce\b", r"\btwice\b", r"\bthrice\b", r"\bqd\b", r"\bbd\b", r"\btid\b"
+    r"\bmg\b", r"\bml\b", r"\bmcg\b", r"\btablets?\b", r"\btabs?\b", r"\bcapsules?\b", r"\bsyrup\b",
+    r"\bonce\b", r"\btwice\b", r"\bthrice\b", r"\bqd\b", r"\bod\b", r"\bbd\b", r"\bbid\b",
+    r"\btid\b", r"\btds\b", r"\bqid\b", r"\bsos\b", r"\b[0-2]-[0-2]-[0-2]\b"
 ]
 
-def quick_extract(text: str, current: dict) -> dict:
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+MED_MARKER_RE = re.compile("|".join(MED_MARKERS))
+# Labels only; the value is the few tokens after them, see ``label_value``.
+NAME_RE = re.compile(r"\b(?:patient\s*name(?:\s*is)?|name\s*is)\b")
+AGE_RE = re.compile(r"\b(\d{1,3})\s*(years?|yrs?)\b")
+DIAG_RE = re.compile(r"\b(?:diagnosis|impression|dx)\s*[:\-]")
+DOSE_RE = re.compile(r"(\d+(?:\.\d+)?\s*(?:mg|ml|mcg|g|iu|units?))\b")
+DURATION_RE = re.compile(r"(?:for\s+)?(\d+)\s*(days?|weeks?|months?)\b")
+# Morning-afternoon-night tablet counts, e.g. "1-0-1".
+DOSING_PATTERN_RE = re.compile(r"\b[0-2]-[0-2]-[0-2]\b")
+
+FREQUENCIES = (
+    ({"once", "qd", "od"}, "Once daily"),
+    ({"twice", "bd", "bid"}, "Twice daily"),
+    ({"thrice", "tid", "tds"}, "Thrice daily"),
+    ({"qid"}, "Four times daily"),
+    ({"hs", "bedtime"}, "At bedtime"),
+    ({"sos"}, "As needed"),
+)
+FREQUENCY_WORDS = {word: label for words, label in FREQUENCIES for word in words}
+
+
+class TermMatcher:
+    """Word-level trie over multi-word terms, matched in one left-to-right pass.
+
+    Terms only match on whole tokens, so "ct" never fires inside "doctor".
+    Cost per utterance depends on token count and the longest term, not on
+    how many terms are registered.
+    """
+
+    _END = object()
+
+    def __init__(self):
+        self._root = {}
+        self.size = 0
+        self.depth = 0
+
+    def add(self, term: str, category: str, canonical: str = None):
+        node = self._root
+        tokens = TOKEN_RE.findall(term.lower())
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        self.depth = max(self.depth, len(tokens))
+        if self._END not in node:
+            self.size += 1
+        node[self._END] = (category, canonical or term)
+
+    def add_many(self, terms, category: str):
+        if isinstance(terms, dict):
+            for term, canonical in terms.items():
+                self.add(term, category, canonical)
+        else:
+            for term in terms:
+                self.add(term, category)
+
+    def find_spans(self, tokens: list) -> list:
+        """Longest matches as ``(start, end, (category, term))`` token index spans."""
+        hits = []
+        i, n = 0, len(tokens)
+        root, end = self._root, self._END
+        while i < n:
+            node = root.get(tokens[i])
+            best, j = None, i
+            while node is not None:
+                j += 1
+                if end in node:
+                    best = (j, node[end])
+                if j >= n:
+                    break
+                node = node.get(tokens[j])
+            if best:
+                hits.append((i, best[0], best[1]))
+                i = best[0]
+            else:
+                i += 1
+        return hits
+
+    def find_tokens(self, tokens: list) -> list:
+        return [hit for _, _, hit in self.find_spans(tokens)]
+
+    def find(self, text: str) -> list:
+        return self.find_tokens(TOKEN_RE.findall(text.lower()))
+
+
+MATCHER = TermMatcher()
+MATCHER.add_many(SYMPTOM_WORDS, "symptom")
+MATCHER.add_many(SYMPTOM_ALIASES, "symptom")
+MATCHER.add_many(TEST_WORDS, "test")
+MATCHER.add_many(TEST_ALIASES, "test")
+# Multi-word lexicon tests match exactly here; single words go through the fuzzy lexicon.
+for _kind, _term, _canonical in read_entries():
+    if _kind == "test" and " " in _term:
+        MATCHER.add(_term, "test", _canonical)
+
+
+QUICK_FIELDS = ("patient_name", "age", "gender", "symptoms", "diagnosis", "medicines", "medical_tests")
+
+
+# Filler that carries no schema information; ignored when scoring coverage.
+STOPWORDS = frozenset("""
+    a an the and or but of to in on at for with from by is are was were be been has have had
+    he she his her him they them it its this that these those i we you my our your
+    patient having complains complaining since days day weeks week months month also
+    mild severe some very old aged year years yrs yr please okay ok so now then take
+    name age gender sex one two three four five six seven eight nine ten
+""".split())
+
+# Dosing context that is explained once a medicine has been recognised.
+MED_CONTEXT = frozenset({
+    "daily", "day", "times", "morning", "night", "after", "before", "food", "meals", "breakfast", "lunch", "dinner",
+    "empty", "stomach", "give", "start", "started", "continue", "dose",
+})
+
+# Words suggesting fields the rules never fill, so the LLM should look at the utterance.
+LLM_FIELD_HINTS = {
+    "doctor": "doctor_name", "dr": "doctor_name", "consultant": "doctor_name",
+    "checkup": "checkup_details", "examination": "checkup_details", "bp": "checkup_details",
+    "pulse": "checkup_details", "pressure": "checkup_details", "temperature": "checkup_details",
+    "note": "notes", "notes": "notes", "advice": "notes", "advised": "notes", "advise": "notes",
+    "follow": "notes", "review": "notes", "avoid": "notes", "diet": "notes",
+    "date": "checkup_date", "today": "checkup_date", "yesterday": "checkup_date",
+}
+
+
+class Coverage:
+    __slots__ = ("score", "fields", "llm_fields")
+
+    def __init__(self, score: float, fields: set, llm_fields: set):
+        self.score = score
+        self.fields = fields
+        self.llm_fields = llm_fields
+
+    def as_dict(self) -> dict:
+        return {"score": round(self.score, 3), "fields": sorted(self.fields), "llm_fields": sorted(self.llm_fields)}
+
+
+NAME_MAX_TOKENS = 3
+DIAGNOSIS_MAX_TOKENS = 5
+
+
+def label_value(t: str, spans: list, start: int, limit: int, stop_at_terms: bool = True) -> list:
+    """Indexes of the tokens after a label at ``start`` that form its value.
+
+    Stops at punctuation, filler ("and", "he", "age"), a digit or any word
+    another rule or field hint owns, so "name is ravi and he has ..." yields
+    only "ravi". Symptom and test terms end a name but not a diagnosis.
+    """
+    used = []
+    pos = start
+    for idx, (s_, e_, tok) in enumerate(spans):
+        if s_ < start:
+            continue
+        if len(used) >= limit or t[pos:s_].strip(" -") or not tok.replace("-", "").isalpha():
+            break
+        if (tok in STOPWORDS or tok in MED_CONTEXT or tok in FREQUENCY_WORDS or tok in LLM_FIELD_HINTS
+                or tok in ("male", "female") or MED_MARKER_RE.fullmatch(tok)
+                or (stop_at_terms and MATCHER.find_tokens([tok]))):
+            break
+        used.append(idx)
+        pos = e_
+    return used
+
+
+DOSE_UNITS = frozenset({"mg", "ml", "mcg", "g", "iu", "unit", "units"})
+
+
+def dosing_token(tok: str) -> bool:
+    """A strength, dose unit, frequency or tablet pattern token."""
+    return (tok.isdigit() or tok in DOSE_UNITS or tok in FREQUENCY_WORDS
+            or DOSE_RE.fullmatch(tok) is not None or DOSING_PATTERN_RE.fullmatch(tok) is not None)
+
+
+def scan(text: str):
+    """Rule-based fields found in ``text`` plus how much of the utterance they explain.
+
+    Returns ``(found, coverage)``. ``found`` is ready for ``PatientRecord.merge``;
+    ``coverage.score`` is the share of non-filler tokens consumed by a rule.
+    """
     t = text.lower()
-    out = {
-        "patient_name": current.get("patient_name"),
-        "age": current.get("age"),
-        "gender": current.get("gender"),
-        "symptoms": list(current.get("symptoms") or []),
-        "diagnosis": current.get("diagnosis"),
-        "medicines": list(current.get("medicines") or []),
-        "medical_tests": list(current.get("medical_tests") or [])
-    }
-    name_match = re.search(r"(name\s*is|patient\s*name)\s*([a-zA-Z ]+)", t)
+    spans = [(m.start(), m.end(), m.group()) for m in TOKEN_RE.finditer(t)]
+    tokens = [tok for _, _, tok in spans]
+    token_set = set(tokens)
+    covered = set()
+
+    def cover(start, end):
+        for idx, (s_, e_, _) in enumerate(spans):
+            if s_ >= start and e_ <= end:
+                covered.add(idx)
+
+    found = {}
+    name_match = NAME_RE.search(t)
     if name_match:
-        candidate = name_match.group(2).strip().title()
-        if len(candidate) <= 40:
-            out["patient_name"] = candidate
-    age_match = re.search(r"\b(\d{1,3})\s*(years?|yrs?)\b", t)
+        used = label_value(t, spans, name_match.end(), NAME_MAX_TOKENS)
+        if used:
+            found["patient_name"] = " ".join(tokens[idx] for idx in used).title()
+            cover(*name_match.span())
+            covered.update(used)
+    age_match = AGE_RE.search(t)
     if age_match:
-        out["age"] = age_match.group(1)
-    if "female" in t:
-        out["gender"] = "Female"
-    elif "male" in t:
-        out["gender"] = "Male"
-    for w in SYMPTOM_WORDS:
-        if w in t and w not in out["symptoms"]:
-            out["symptoms"].append(w)
-    diag_match = re.search(r"(diagnosis|impression|dx)\s*[:\-]\s*([a-zA-Z \-]+)", t)
+        found["age"] = age_match.group(1)
+        cover(*age_match.span())
+    for idx, tok in enumerate(tokens):
+        if tok in ("female", "male"):
+            found["gender"] = "Female" if "female" in token_set else "Male"
+            covered.add(idx)
+    for start, end, (category, term) in MATCHER.find_spans(tokens):
+        covered.update(range(start, end))
+        if category == "symptom":
+            found.setdefault("symptoms", []).append(term)
+        elif category == "test":
+            found.setdefault("medical_tests", []).append({"name": term.title()})
+    diag_match = DIAG_RE.search(t)
     if diag_match:
-        out["diagnosis"] = diag_match.group(2).strip().title()
-    if any(re.search(m, t) for m in MED_MARKERS):
-        med_name = None
-        name_match2 = re.search(r"([a-zA-Z][a-zA-Z0-9\- ]{2,})\s*(\d+\s*mg|\d+\s*ml)?", t)
-        if name_match2:
-            med_name = name_match2.group(1).strip().title()
-        dose = None
-        dose_match = re.search(r"(\d+\s*mg|\d+\s*ml)", t)
+        used = label_value(t, spans, diag_match.end(), DIAGNOSIS_MAX_TOKENS, stop_at_terms=False)
+        if used:
+            found["diagnosis"] = " ".join(tokens[idx] for idx in used).title()
+            cover(*diag_match.span())
+            covered.update(used)
+    matched = set(covered)
+    marker = MED_MARKER_RE.search(t) is not None
+    drugs = []
+    lexicon = get_lexicon()
+    for idx, tok in enumerate(tokens):
+        if idx in matched or len(tok) < 3 or tok.isdigit() or tok in STOPWORDS or tok in MED_CONTEXT or tok in FREQUENCY_WORDS:
+            continue
+        hit = lexicon.lookup(tok)
+        if hit is None:
+            continue
+        kind, term, canonical, distance = hit
+        if kind == "word":
+            continue
+        if distance:
+            # A corrected spelling only counts right beside its dose or frequency ("amlong 5 mg", "bd crocin").
+            if not any(0 <= j < len(tokens) and dosing_token(tokens[j]) for j in (idx - 1, idx + 1)):
+                continue
+        if kind == "test":
+            found.setdefault("medical_tests", []).append({"name": canonical.title()})
+            covered.add(idx)
+        elif distance or marker or len(term) >= MIN_FUZZY_LEN:
+            drugs.append((idx, term, canonical))
+    if drugs:
+        found["medicines"] = [
+            parse_dosing(t, spans, tokens, idx, drugs[k + 1][0] if k + 1 < len(drugs) else len(tokens), term, canonical, covered)
+            for k, (idx, term, canonical) in enumerate(drugs)
+        ]
+    elif marker:
+        dose_match = DOSE_RE.search(t)
         if dose_match:
-            dose = dose_match.group(1)
-        freq = None
-        if "once" in t or "qd" in t:
-            freq = "Once daily"
-        elif "twice" in t or "bd" in t:
-            freq = "Twice daily"
-        elif "thrice" in t or "tid" in t:
-            freq = "Thrice daily"
-        if med_name:
-            exists = False
-            for m in out["medicines"]:
-                if m.get("name") and m.get("name").lower() == med_name.lower():
-                    if dose:
-                        m["dose"] = dose
-                    if freq:
-                        m["frequency"] = freq
-                    exists = True
-                    break
-            if not exists:
-                out["medicines"].append({"name": med_name, "dose": dose, "frequency": freq})
-    for tw in TEST_WORDS:
-        if tw in t and tw not in [x.get("name","") for x in out["medical_tests"]]:
-            out["medical_tests"].append({"name": tw.title()})
-    return out
\ No newline at end of file
+            # No known drug: take the word right before the dose rather than the whole run of text.
+            before = [idx for idx, (_, e_, _) in enumerate(spans) if e_ <= dose_match.start()]
+            if (before and tokens[before[-1]].isalpha() and tokens[before[-1]] not in STOPWORDS
+                    and not MED_MARKER_RE.fullmatch(tokens[before[-1]])):
+                idx = before[-1]
+                found["medicines"] = [parse_dosing(t, spans, tokens, idx, len(tokens), tokens[idx], tokens[idx], covered)]
+    if marker:
+        for idx, tok in enumerate(tokens):
+            if MED_MARKER_RE.fullmatch(tok) or tok in MED_CONTEXT or tok in FREQUENCY_WORDS:
+                covered.add(idx)
+    content = [idx for idx, tok in enumerate(tokens) if tok not in STOPWORDS and not tok.isdigit()]
+    hit = sum(1 for idx in content if idx in covered)
+    score = hit / len(content) if content else 1.0
+    llm_fields = {LLM_FIELD_HINTS[tok] for tok in tokens if tok in LLM_FIELD_HINTS}
+    return found, Coverage(score, set(found), llm_fields)
+
+
+def parse_dosing(t: str, spans: list, tokens: list, idx: int, stop: int, term: str, canonical: str, covered: set) -> dict:
+    """Medicine entry for the drug at token ``idx``; dose, frequency and duration come from tokens before ``stop``."""
+    covered.add(idx)
+    lo = spans[idx][1]
+    hi = spans[stop][0] if stop < len(spans) else len(t)
+    clause = t[lo:hi]
+    # The record upserts medicines by name, so two brands of one generic must keep their own names.
+    medicine = {"name": term.title(), "dose": None, "frequency": None}
+    if canonical != term:
+        medicine["generic"] = canonical.title()
+    dose_match = DOSE_RE.search(clause)
+    if dose_match:
+        medicine["dose"] = dose_match.group(1)
+    elif idx + 1 < stop and tokens[idx + 1].isdigit() and (idx + 2 >= len(tokens) or tokens[idx + 2] not in ("times", "days", "day")):
+        # "Dolo 650": a bare strength straight after the name is in mg.
+        medicine["dose"] = tokens[idx + 1] + " mg"
+    pattern = DOSING_PATTERN_RE.search(clause)
+    if pattern:
+        medicine["frequency"] = pattern.group()
+    else:
+        for j in range(idx + 1, stop):
+            if tokens[j] in FREQUENCY_WORDS:
+                medicine["frequency"] = FREQUENCY_WORDS[tokens[j]]
+                break
+    duration = DURATION_RE.search(clause)
+    if duration:
+        medicine["duration"] = f"{duration.group(1)} {duration.group(2).title()}"
+    for j in range(idx + 1, stop):
+        if tokens[j] in FREQUENCY_WORDS or tokens[j] in MED_CONTEXT or MED_MARKER_RE.fullmatch(tokens[j]):
+            covered.add(j)
+    for match in (dose_match, duration):
+        if match:
+            for j in range(idx + 1, stop):
+                if spans[j][0] >= lo + match.start() and spans[j][1] <= lo + match.end():
+                    covered.add(j)
+    return medicine
+
+
+def scan_fields(text: str) -> dict:
+    """Return only the fields the rules found in ``text``, ready for ``PatientRecord.merge``."""
+    return scan(text)[0]
+
+
+def quick_extract_into(text: str, record: PatientRecord) -> set:
+    """Merge rule-based hits into ``record`` in place and return the changed field names."""
+    return record.merge(scan_fields(text))
+
+
+def quick_extract_scored(text: str, record: PatientRecord):
+    """Like ``quick_extract_into`` but also returns the utterance's ``Coverage``."""
+    found, coverage = scan(text)
+    return record.merge(found), coverage
+
+
+class CoverageGate:
+    """Decides whether an utterance still needs the LLM after the rules ran, and counts the outcome."""
+
+    def __init__(self, threshold: float = 0.8):
+        self.threshold = threshold
+        self.checked = 0
+        self.avoided = 0
+        self.low_coverage = 0
+        self.llm_fields = 0
+
+    def needs_llm(self, coverage: Coverage) -> bool:
+        self.checked += 1
+        if coverage.llm_fields:
+            self.llm_fields += 1
+            return True
+        if coverage.score < self.threshold:
+            self.low_coverage += 1
+            return True
+        self.avoided += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "threshold": self.threshold,
+            "checked": self.checked,
+            "llm_avoided": self.avoided,
+            "llm_low_coverage": self.low_coverage,
+            "llm_field_hints": self.llm_fields,
+            "avoided_ratio": round(self.avoided / self.checked, 3) if self.checked else 0.0,
+        }
+
+
+GATE = CoverageGate(float(os.getenv("EXTRACTION_COVERAGE_THRESHOLD", "0.8")))
+
+
+def quick_extract(text: str, current: dict) -> dict:
+    record = PatientRecord.from_dict(current)
+    quick_extract_into(text, record)
+    return record.to_dict(QUICK_FIELDS)
+
+
+def quick_extract_batch(texts: list, current: dict = None) -> list:
+    """Run ``quick_extract`` over many transcripts against the same starting record."""
+    base = current or {}
+    return [quick_extract(text, base) for text in texts]
@@ -0,0 +1,193 @@
+import os
+import io
+import math
+import time
+import base64
+import asyncio
+import resource
+from concurrent.futures import ProcessPoolExecutor
+from app.services.metrics import IMAGE_WORKER_RSS, observe_stage
+
+
+class PreprocessOptions:
+    __slots__ = ("enabled", "max_pixels", "format", "quality", "grayscale", "crop", "crop_threshold")
+
+    def __init__(self, enabled=True, max_pixels=1_600_000, format="JPEG", quality=80,
+                 grayscale=True, crop=True, crop_threshold=40):
+        self.enabled = enabled
+        self.max_pixels = max_pixels
+        self.format = format.upper()
+        self.quality = quality
+        self.grayscale = grayscale
+        self.crop = crop
+        self.crop_threshold = crop_threshold
+
+    @classmethod
+    def from_env(cls) -> "PreprocessOptions":
+        flag = lambda name, default: os.getenv(name, default).lower() not in ("0", "false", "no")
+        return cls(
+            enabled=flag("IMAGE_PREPROCESS", "1"),
+            max_pixels=int(os.getenv("IMAGE_MAX_PIXELS", "1600000")),
+            format=os.getenv("IMAGE_FORMAT", "JPEG"),
+            quality=int(os.getenv("IMAGE_QUALITY", "80")),
+            grayscale=flag("IMAGE_GRAYSCALE", "1"),
+            crop=flag("IMAGE_CROP", "1"),
+        )
+
+
+class PreparedImage:
+    __slots__ = ("data", "mime", "stats")
+
+    def __init__(self, data: bytes, mime: str, stats: dict):
+        self.data = data
+        self.mime = mime
+        self.stats = stats
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode()}"
+
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def load_pil():
+    """Import Pillow on first use; workers refuse anything over the upload pixel cap outright."""
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = int(os.getenv("UPLOAD_MAX_PIXELS", "50000000"))
+    return Image
+
+
+def _crop_to_document(image, threshold: int):
+    from PIL import Image, ImageChops
+
+    # Treat the top-left pixel as background and keep the box around everything that differs from it.
+    background = Image.new(image.mode, image.size, image.getpixel((0, 0)))
+    diff = ImageChops.difference(image, background)
+    if diff.mode != "L":
+        diff = diff.convert("L")
+    bbox = diff.point(lambda p: 255 if p > threshold else 0).getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) > 0.95 * image.width * image.height:
+        return image
+    pad = max(image.width, image.height) // 100
+    return image.crop((max(left - pad, 0), max(top - pad, 0),
+                       min(right + pad, image.width), min(bottom + pad, image.height)))
+
+
+def prepare_image(data, options: PreprocessOptions = None) -> PreparedImage:
+    """Shrink an uploaded prescription photo to what the vision model needs.
+
+    ``data`` is the image bytes or the path of a spooled upload. Runs in a
+    worker process; every stage's wall time lands in ``stats`` (milliseconds)
+    alongside input/output sizes and the worker's peak RSS.
+    """
+    from PIL import ImageOps
+
+    Image = load_pil()
+    options = options or PreprocessOptions.from_env()
+    if isinstance(data, str):
+        input_bytes = os.path.getsize(data)
+        image = Image.open(data)
+    else:
+        input_bytes = len(data)
+        image = Image.open(io.BytesIO(data))
+    stats = {"input_bytes": input_bytes}
+    t0 = start = time.perf_counter()
+
+    def mark(stage):
+        nonlocal t0
+        now = time.perf_counter()
+        stats[f"{stage}_ms"] = round((now - t0) * 1000, 2)
+        t0 = now
+
+    source_format = image.format
+    if not options.enabled:
+        image.verify()
+        if isinstance(data, str):
+            with open(data, "rb") as f:
+                data = f.read()
+        mime = Image.MIME.get(source_format, "application/octet-stream")
+        stats.update(output_bytes=len(data), saved_bytes=0, total_ms=0.0)
+        return PreparedImage(data, mime, stats)
+    if source_format == "JPEG" and image.width * image.height > options.max_pixels:
+        scale = math.sqrt(options.max_pixels / (image.width * image.height))
+        image.draft("L" if options.grayscale else "RGB", (int(image.width * scale), int(image.height * scale)))
+    image.load()
+    mark("decode")
+    image = ImageOps.exif_transpose(image)
+    mark("orient")
+    if options.grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    mark("color")
+    if options.crop:
+        image = _crop_to_document(image, options.crop_threshold)
+    mark("crop")
+    if image.width * image.height > options.max_pixels:
+        scale = math.sqrt(options.max_pixels / (image.width * image.height))
+        image = image.resize((max(int(image.width * scale), 1), max(int(image.height * scale), 1)), Image.LANCZOS)
+    mark("resize")
+    out = io.BytesIO()
+    image.save(out, format=options.format, quality=options.quality, optimize=True)
+    mark("encode")
+    output = out.getvalue()
+    stats.update(
+        width=image.width,
+        height=image.height,
+        output_bytes=len(output),
+        saved_bytes=input_bytes - len(output),
+        total_ms=round((time.perf_counter() - start) * 1000, 2),
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    )
+    return PreparedImage(output, MIME_TYPES.get(options.format, "image/jpeg"), stats)
+
+
+_pool = None
+
+
+def _warm_worker():
+    load_pil()
+
+
+def _workers() -> int:
+    return int(os.getenv("IMAGE_WORKERS", "2"))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_workers(), initializer=_warm_worker)
+    return _pool
+
+
+async def warm_up():
+    """Start the image workers with Pillow imported, and import it here for the upload header check."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    load_pil()
+    await asyncio.gather(*(loop.run_in_executor(pool, _warm_worker) for _ in range(_workers())))
+
+
+async def prepare_image_async(data, options: PreprocessOptions = None) -> PreparedImage:
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    image = await loop.run_in_executor(_get_pool(), prepare_image, data, options or PreprocessOptions.from_env())
+    # The worker's per-stage timings travel back in ``stats``; queueing shows up in the total.
+    for key, value in image.stats.items():
+        if key.endswith("_ms") and key != "total_ms":
+            observe_stage("image_" + key[:-3], value / 1000)
+    observe_stage("image_preprocess", time.perf_counter() - started)
+    if "peak_rss_kb" in image.stats:
+        IMAGE_WORKER_RSS.set(image.stats["peak_rss_kb"])
+    return image
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
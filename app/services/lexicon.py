@@ -0,0 +1,204 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "lexicon.tsv")
+# "word" rows are ordinary vocabulary that must never be corrected into a drug or test.
+KINDS = ("drug", "test", "word")
+# Shorter terms ("pan", "mox", "ct") only match exactly; a typo there is more likely another word.
+MIN_FUZZY_LEN = 5
+# Brand names are short coinages ("amlong", "daxid") that sit one edit from everyday words.
+MIN_FUZZY_BRAND_LEN = 7
+
+_MAGIC = b"PMSLEX1\0"
+_HEADER = struct.Struct("<8s16sIII")
+
+
+def _key(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def _variants(token: str) -> set:
+    """The token plus, when long enough, every single-character deletion (SymSpell)."""
+    if len(token) < MIN_FUZZY_LEN:
+        return {token}
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True when ``a`` and ``b`` differ by at most one insert, delete, substitution or adjacent swap."""
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) <= 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def read_entries(path: str = DEFAULT_SOURCE):
+    """``(kind, term, canonical)`` rows of a lexicon TSV; blank canonical means the term itself."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            kind, term, canonical = (line.rstrip("\n").split("\t") + ["", ""])[:3]
+            yield kind, " ".join(term.lower().split()), canonical.strip() or term.strip()
+
+
+def build_index(entries, path: str, digest: bytes = b"\0" * 16) -> int:
+    """Write a sorted deletion index for single-token ``entries`` to ``path``; returns the entry count.
+
+    Layout: header, sorted u64 variant hashes, u32 entry ids, u32 term and
+    canonical offsets, u8 kinds, then a NUL-separated UTF-8 string blob. The
+    file is written beside ``path`` and renamed into place so concurrent
+    workers never map a half-written index.
+    """
+    blob = bytearray()
+    offsets = {}
+
+    def intern(s: str) -> int:
+        off = offsets.get(s)
+        if off is None:
+            off = offsets[s] = len(blob)
+            blob.extend(s.encode() + b"\0")
+        return off
+
+    pairs, term_offs, canon_offs, kinds = [], [], [], bytearray()
+    for kind, term, canonical in entries:
+        if " " in term or kind not in KINDS:
+            continue
+        entry_id = len(kinds)
+        term_offs.append(intern(term))
+        canon_offs.append(intern(canonical))
+        kinds.append(KINDS.index(kind))
+        pairs.extend((_key(v), entry_id) for v in _variants(term))
+    pairs.sort()
+    n, k = len(kinds), len(pairs)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, digest, n, k, len(blob)))
+        f.write(struct.pack(f"<{k}Q", *(p[0] for p in pairs)))
+        f.write(struct.pack(f"<{k}I", *(p[1] for p in pairs)))
+        f.write(struct.pack(f"<{n}I", *term_offs))
+        f.write(struct.pack(f"<{n}I", *canon_offs))
+        f.write(bytes(kinds))
+        f.write(bytes(blob))
+    os.replace(tmp, path)
+    return n
+
+
+class Lexicon:
+    """Memory-mapped drug/test index with exact and one-edit lookup.
+
+    The index is read through ``memoryview`` casts over the mapping, so it
+    costs page cache rather than Python objects and is shared by every
+    worker process that maps the same file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.digest, n, k, _ = _HEADER.unpack_from(self._mm)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not a lexicon index")
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+        self._keys = view[pos:pos + 8 * k].cast("Q")
+        pos += 8 * k
+        self._ids = view[pos:pos + 4 * k].cast("I")
+        pos += 4 * k
+        self._term_offs = view[pos:pos + 4 * n].cast("I")
+        pos += 4 * n
+        self._canon_offs = view[pos:pos + 4 * n].cast("I")
+        pos += 4 * n
+        self._kinds = view[pos:pos + n]
+        self._blob = pos + n
+        self.size = n
+        self.lookup = lru_cache(maxsize=4096)(self._lookup)
+
+    def _string(self, offset: int) -> str:
+        start = self._blob + offset
+        return self._mm[start:self._mm.find(b"\0", start)].decode()
+
+    def entry(self, entry_id: int) -> tuple:
+        return (
+            KINDS[self._kinds[entry_id]],
+            self._string(self._term_offs[entry_id]),
+            self._string(self._canon_offs[entry_id]),
+        )
+
+    def _entry_ids(self, key: int):
+        keys, i = self._keys, bisect_left(self._keys, key)
+        while i < len(keys) and keys[i] == key:
+            yield self._ids[i]
+            i += 1
+
+    def _lookup(self, token: str):
+        """Best ``(kind, term, canonical, distance)`` for ``token``, or None."""
+        best = None
+        seen = set()
+        for variant in _variants(token):
+            for entry_id in self._entry_ids(_key(variant)):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                kind, term, canonical = self.entry(entry_id)
+                if term == token:
+                    return kind, term, canonical, 0
+                min_len = MIN_FUZZY_LEN if canonical.lower() == term else MIN_FUZZY_BRAND_LEN
+                if best is None and kind != "word" and len(term) >= min_len and within_one_edit(term, token):
+                    best = (kind, term, canonical, 1)
+        return best
+
+    def close(self):
+        self.lookup.cache_clear()
+        for view in (self._keys, self._ids, self._term_offs, self._canon_offs, self._kinds):
+            view.release()
+        self._mm.close()
+
+
+def source_digest(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=16).digest()
+
+
+def open_lexicon(source: str = DEFAULT_SOURCE, index_path: str = None) -> Lexicon:
+    """Map the index for ``source``, building it first if missing or stale."""
+    digest = source_digest(source)
+    index_path = index_path or os.path.join(tempfile.gettempdir(), f"pms-lexicon-{digest.hex()[:12]}.idx")
+    try:
+        lexicon = Lexicon(index_path)
+        if lexicon.digest == digest:
+            return lexicon
+        lexicon.close()
+    except (OSError, ValueError, struct.error):
+        pass
+    build_index(read_entries(source), index_path, digest)
+    return Lexicon(index_path)
+
+
+_lexicon = None
+_lock = threading.Lock()
+
+
+def get_lexicon() -> Lexicon:
+    global _lexicon
+    if _lexicon is None:
+        with _lock:
+            if _lexicon is None:
+                _lexicon = open_lexicon(os.getenv("LEXICON_PATH") or DEFAULT_SOURCE, os.getenv("LEXICON_INDEX_PATH") or None)
+    return _lexicon
@@ -0,0 +1,262 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import contextvars
+from contextlib import asynccontextmanager
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_PRESCRIPTION = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_PRESCRIPTION: "prescription", PRIORITY_BATCH: "batch"}
+
+# Lets a caller (e.g. batch ingestion) demote every model call made inside its tasks.
+priority_override = contextvars.ContextVar("llm_priority_override", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "level", "updated")
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+def api_error_status(exc: Exception):
+    """HTTP status of an API error, None for a connection error, False for anything else."""
+    # Deferred like the SDK clients themselves; the call has imported openai by the time it fails.
+    from openai import APIConnectionError, APIStatusError
+
+    if isinstance(exc, APIStatusError):
+        return exc.status_code
+    if isinstance(exc, APIConnectionError):
+        return None
+    return False
+
+
+def retry_after(exc: Exception):
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    """Admission control for every model call made by this worker.
+
+    Calls wait in a priority queue (interactive before prescription before
+    batch) until a concurrency slot is free and both the request and token
+    buckets can cover them. ``run`` retries 429/5xx/connection failures with
+    jittered exponential backoff; repeated server-side failures open a circuit
+    breaker that fails calls fast until ``breaker_cooldown`` has passed and a
+    single probe succeeds.
+    """
+
+    def __init__(self, rpm: float = 500, tpm: float = 200_000, max_concurrency: int = 32, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_max: float = 20.0, breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.active = 0
+        self.state = "closed"
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+        self.wait_total = {p: 0.0 for p in PRIORITY_NAMES}
+        self.wait_max = {p: 0.0 for p in PRIORITY_NAMES}
+        self.admitted = {p: 0 for p in PRIORITY_NAMES}
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._queue = []
+        self._counter = itertools.count()
+        self._timer = None
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "500")),
+            tpm=float(os.getenv("LLM_TPM", "200000")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "4")),
+            breaker_threshold=int(os.getenv("LLM_BREAKER_THRESHOLD", "5")),
+            breaker_cooldown=float(os.getenv("LLM_BREAKER_COOLDOWN", "30")),
+        )
+
+    def _check_breaker(self):
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.breaker_cooldown:
+                self.rejected += 1
+                raise CircuitOpenError("LLM circuit breaker is open")
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                self.rejected += 1
+                raise CircuitOpenError("LLM circuit breaker is half-open; probe in flight")
+            self._probing = True
+
+    def _record_success(self):
+        self._consecutive_failures = 0
+        self._probing = False
+        self.state = "closed"
+
+    def _record_failure(self, trips_breaker: bool):
+        self.failures += 1
+        if not trips_breaker:
+            self._probing = False
+            return
+        self._consecutive_failures += 1
+        if self.state == "half_open" or self._consecutive_failures >= self.breaker_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def _pump(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            _, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if self.active >= self.max_concurrency:
+                return
+            now = time.monotonic()
+            delay = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.active += 1
+            future.set_result(None)
+
+    def resolve_priority(self, priority: int) -> int:
+        override = priority_override.get()
+        return priority if override is None else max(priority, override)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_PRESCRIPTION, tokens: int = 0):
+        """Hold one admitted call for the duration of the block (used directly for streams)."""
+        priority = self.resolve_priority(priority)
+        self._check_breaker()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future, tokens))
+        enqueued = time.monotonic()
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.active -= 1
+                self._pump()
+            self._probing = False
+            raise
+        waited = time.monotonic() - enqueued
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+        self.admitted[priority] += 1
+        self.calls += 1
+        # The outcome of the block feeds the breaker, so streams count exactly like ``run`` calls.
+        try:
+            yield
+        except Exception as exc:
+            status = api_error_status(exc)
+            if status is False:
+                self._probing = False
+            else:
+                self._record_failure(trips_breaker=status is None or status >= 500)
+            raise
+        except BaseException:
+            self._probing = False
+            raise
+        else:
+            self._record_success()
+        finally:
+            self.active -= 1
+            self._pump()
+
+    async def run(self, fn, priority: int = PRIORITY_PRESCRIPTION, tokens: int = 0):
+        """Await ``fn()`` under admission control with retries; refunds unused estimated tokens."""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(priority, tokens):
+                    result = await fn()
+            except Exception as exc:
+                status = api_error_status(exc)
+                server_side = status is None or (status is not False and status >= 500)
+                if status is False or attempt >= self.max_retries or not (server_side or status == 429):
+                    raise
+                delay = retry_after(exc)
+            else:
+                usage = getattr(result, "usage", None)
+                used = getattr(usage, "total_tokens", None)
+                if used is not None and used < tokens:
+                    self.tokens.give(tokens - used)
+                return result
+            if delay is None:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.5)
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def queue_depth(self) -> dict:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future, _ in self._queue:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        return depth
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth(),
+            "circuit": self.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level, 1),
+            "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+            "wait_avg_ms": {PRIORITY_NAMES[p]: round(self.wait_total[p] / n * 1000, 2) if n else 0.0 for p, n in self.admitted.items()},
+            "wait_max_ms": {PRIORITY_NAMES[p]: round(v * 1000, 2) for p, v in self.wait_max.items()},
+        }
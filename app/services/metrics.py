@@ -0,0 +1,218 @@
+import os
+import re
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Seconds; spans sub-millisecond rule extraction up to multi-second model calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+trace_id = ContextVar("trace_id", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        REGISTRY.register(self)
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        return self.header() + [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = self.header()
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics plus ``stats()`` providers, rendered in the Prometheus text format.
+
+    Updates are plain dict/list operations on the event loop; there is no
+    lock on the hot path.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._stats = {}
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def register_stats(self, prefix: str, provider):
+        """Export every numeric value of ``provider()`` (nested one level) as ``pms_<prefix>_<key>`` gauges."""
+        self._stats[prefix] = provider
+
+    def _render_stats(self) -> list:
+        lines = []
+        for prefix, provider in self._stats.items():
+            try:
+                stats = provider() or {}
+            except Exception:
+                continue
+            for key, value in stats.items():
+                name = re.sub(r"[^a-zA-Z0-9_]", "_", f"pms_{prefix}_{key}")
+                if isinstance(value, bool) or isinstance(value, (int, float)):
+                    lines += [f"# TYPE {name} gauge", f"{name} {_number(int(value) if isinstance(value, bool) else value)}"]
+                elif isinstance(value, dict):
+                    series = [(k, v) for k, v in value.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                    if series:
+                        lines.append(f"# TYPE {name} gauge")
+                        lines += [f'{name}{{key="{_escape(k)}"}} {_number(v)}' for k, v in series]
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        lines += self._render_stats()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram("pms_stage_seconds", "Wall time of one pipeline stage.", ("stage",))
+HTTP_SECONDS = Histogram("pms_http_request_seconds", "HTTP request latency, including streamed bodies.", ("method", "route", "status"))
+LLM_SECONDS = Histogram("pms_llm_request_seconds", "Model call latency including scheduler queueing and retries.", ("priority", "mode"))
+LLM_TOKENS = Counter("pms_llm_tokens_total", "Tokens reported in response.usage.", ("kind",))
+WEBSOCKETS_OPEN = Gauge("pms_websockets_open", "Open websocket connections.")
+IMAGE_WORKER_RSS = Gauge("pms_image_worker_peak_rss_kb", "Peak RSS reported by the last image worker to finish a job.")
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, name)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, name)
+
+
+def record_usage(usage):
+    if usage is None:
+        return
+    LLM_TOKENS.inc("prompt", amount=getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_TOKENS.inc("completion", amount=getattr(usage, "completion_tokens", 0) or 0)
+
+
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request latency by route, open websocket count and optional trace IDs.
+
+    With ``trace_ids`` every HTTP response carries ``X-Request-ID`` (the
+    caller's own if it sent a sane one) and the ID is available to handlers
+    through ``trace_id`` while the request runs.
+    """
+
+    def __init__(self, app, trace_ids: bool = None):
+        self.app = app
+        if trace_ids is None:
+            trace_ids = os.getenv("TRACE_IDS", "0").lower() in ("1", "true", "yes")
+        self.trace_ids = trace_ids
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            WEBSOCKETS_OPEN.inc()
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                WEBSOCKETS_OPEN.dec()
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        request_id = None
+        if self.trace_ids:
+            incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+            request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+            trace_id.set(request_id)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if request_id:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start, scope["method"], getattr(route, "path", "unmatched"), str(status)
+            )
@@ -1,19 +1,73 @@
 import os
-import io
-import base64
 import json
-from dotenv import load_dotenv
-from PIL import Image
-from openai import OpenAI
+import time
+from pathlib import Path
+from app.services.patient_record import PatientRecord, validate_fields
+from app.services.chat_sessions import ChatSessionStore, estimate_tokens
+from app.services.llm_scheduler import LLMScheduler, PRIORITY_INTERACTIVE, PRIORITY_NAMES, PRIORITY_PRESCRIPTION
+from app.services.metrics import LLM_SECONDS, record_usage, stage
+from app.services.image_preprocess import PreparedImage, prepare_image, prepare_image_async
 
-load_dotenv()
+
+def load_env():
+    """Load ``.env`` like python-dotenv's ``find_dotenv`` would, without importing it when there is none."""
+    here = Path(__file__).resolve().parent
+    if any((d / ".env").is_file() for d in (Path.cwd(), here, *here.parents)):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+
+
+load_env()
+
+# Bump whenever the prescription or extraction prompts change so cached analyses are not reused.
+PROMPT_VERSION = "2"
+
+CHAT_MAX_TOKENS = 500
+
+PRESCRIPTION_PROMPT = """
+            Analyze this prescription image.
+            Provide:
+            1. Patient Name (if visible)
+            2. Doctor Name (if visible)
+            3. Date
+            4. Medicines & dosage
+            5. Instructions
+            6. Contraindications
+            Format in Markdown.
+        """
+
+EXTRACTION_SCHEMA = (
+    "patient_name, age, gender, doctor_name, checkup_date, checkup_details, symptoms, diagnosis, medicines, medical_tests, notes. "
+    "symptoms: array of strings. "
+    "medicines: array of objects with keys: name, dose, frequency. "
+    "medical_tests: array of objects with keys: name, optional details. "
+    "If a field is not mentioned, leave as null or empty array. "
+)
+
+FUSED_PRESCRIPTION_PROMPT = (
+    PRESCRIPTION_PROMPT
+    + "Return ONLY a JSON object with two keys. "
+    "\"analysis\": the Markdown summary above as a string. "
+    "\"extracted_data\": an object with these keys: "
+    + EXTRACTION_SCHEMA
+)
 
 class OpenAIClient:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
+        base_url = os.getenv("OPENAI_BASE_URL") or None
         if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        self.client = OpenAI(api_key=api_key)
+            # A local stand-in (benchmarks/mock_llm.py) needs no key; the real API does.
+            if not base_url:
+                raise ValueError("OPENAI_API_KEY environment variable not set")
+            api_key = "local"
+        self.model = os.getenv("OPENAI_MODEL")
+        self.fused_prescription = os.getenv("PRESCRIPTION_FUSED", "1").lower() not in ("0", "false", "no")
+        self._api_key = api_key
+        self._base_url = base_url
+        self._client = None
+        self._async_client = None
         self.system_prompt = (
             "You are a helpful medical assistant. "
             "If the user speaks in Hindi, respond in Hindi. "
@@ -21,136 +75,254 @@ class OpenAIClient:
             "Always detect the user's language and match it. "
             "This is not a diagnosis. Always consult a qualified doctor."
         )
-        self.chat_history = [
-            {"role": "system", "content": self.system_prompt}
+        self.chat_sessions = ChatSessionStore.from_env(self.system_prompt)
+        self.scheduler = LLMScheduler.from_env()
+
+    # The openai SDK takes about half a second to import, so the clients are built on first use.
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+
+            self._client = OpenAI(api_key=self._api_key, base_url=self._base_url)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            # One pooled keep-alive connection set shared by every coroutine on this worker.
+            # Retries are owned by the scheduler so backoff and the circuit breaker see every attempt.
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                max_retries=0,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "100")),
+                        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "20")),
+                        keepalive_expiry=float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30")),
+                    )
+                ),
+            )
+        return self._async_client
+
+    async def warm_up(self):
+        """Import the SDK and open a pooled connection (DNS, TCP, TLS) with one unbilled ``GET /models``."""
+        import httpx
+
+        try:
+            await self.async_client.get("/models", cast_to=httpx.Response)
+        except Exception:
+            pass  # any answer, even 401/404, leaves a warm keep-alive connection behind
+
+    @staticmethod
+    def _estimate_request_tokens(messages: list, max_tokens: int) -> int:
+        total = max_tokens
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                total += estimate_tokens(content)
+            else:
+                for part in content:
+                    # Image parts are billed per tile; a detail=auto document photo lands near this.
+                    total += estimate_tokens(part["text"]) if part["type"] == "text" else 765
+        return total
+
+    async def _acreate(self, priority: int, **kwargs):
+        tokens = self._estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+        started = time.perf_counter()
+        response = await self.scheduler.run(
+            lambda: self.async_client.chat.completions.create(model=self.model, **kwargs),
+            priority,
+            tokens,
+        )
+        LLM_SECONDS.observe(time.perf_counter() - started, PRIORITY_NAMES[self.scheduler.resolve_priority(priority)], "call")
+        record_usage(getattr(response, "usage", None))
+        return response
+
+    async def _astream(self, priority: int, **kwargs):
+        """Yield content deltas while holding one scheduler slot for the whole stream."""
+        tokens = self._estimate_request_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+        started = time.perf_counter()
+        async with self.scheduler.slot(priority, tokens):
+            stream = await self.async_client.chat.completions.create(
+                model=self.model, stream=True, stream_options={"include_usage": True}, **kwargs
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                # The usage chunk comes last, with no choices.
+                record_usage(getattr(chunk, "usage", None))
+        LLM_SECONDS.observe(time.perf_counter() - started, PRIORITY_NAMES[self.scheduler.resolve_priority(priority)], "stream")
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+        if self._client is not None:
+            self._client.close()
+
+    def _prescription_messages(self, image: PreparedImage, prompt: str = PRESCRIPTION_PROMPT) -> list:
+        with stage("image_base64"):
+            image_url = image.data_url()
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            }
         ]
 
     def analyze_prescription(self, image_bytes: bytes) -> str:
-        image = Image.open(io.BytesIO(image_bytes))
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        image_base64 = base64.b64encode(buffered.getvalue()).decode()
-        prompt = """
-            Analyze this prescription image.
-            Provide:
-            1. Patient Name (if visible)
-            2. Doctor Name (if visible)
-            3. Date
-            4. Medicines & dosage
-            5. Instructions
-            6. Contraindications
-            Format in Markdown.
-        """
         response = self.client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL"),
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
+            model=self.model,
+            messages=self._prescription_messages(prepare_image(image_bytes)),
+            max_tokens=800
+        )
+        return response.choices[0].message.content
+
+    async def aanalyze_prescription(self, image) -> str:
+        """``image`` is raw upload bytes or an already preprocessed ``PreparedImage``."""
+        if not isinstance(image, PreparedImage):
+            image = await prepare_image_async(image)
+        response = await self._acreate(
+            PRIORITY_PRESCRIPTION,
+            messages=self._prescription_messages(image),
             max_tokens=800
         )
         return response.choices[0].message.content
 
-    def chat_response(self, text: str) -> str:
-        self.chat_history.append({"role": "user", "content": text})
+    async def astream_prescription(self, image):
+        """Yield the Markdown analysis piece by piece as the model produces it."""
+        if not isinstance(image, PreparedImage):
+            image = await prepare_image_async(image)
+        async for piece in self._astream(
+            PRIORITY_PRESCRIPTION,
+            messages=self._prescription_messages(image),
+            max_tokens=800
+        ):
+            yield piece
+
+    async def aanalyze_prescription_fused(self, image):
+        """Markdown summary and structured fields from one model call.
+
+        Returns ``(analysis, extracted_data)``, or None when the reply does not
+        validate so the caller can fall back to the two-call path.
+        """
+        if not isinstance(image, PreparedImage):
+            image = await prepare_image_async(image)
+        response = await self._acreate(
+            PRIORITY_PRESCRIPTION,
+            messages=self._prescription_messages(image, FUSED_PRESCRIPTION_PROMPT),
+            max_tokens=1200,
+            response_format={"type": "json_object"}
+        )
+        data = parse_extraction(response.choices[0].message.content)
+        analysis = data.get("analysis")
+        extracted = data.get("extracted_data")
+        if not isinstance(analysis, str) or not analysis.strip() or not validate_fields(extracted):
+            return None
+        record = PatientRecord()
+        record.merge(extracted)
+        return analysis, record.to_dict()
+
+    def chat_response(self, text: str, session_id: str = "default") -> str:
         response = self.client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL"),
-            messages=self.chat_history,
-            max_tokens=500
+            model=self.model,
+            messages=self.chat_sessions.messages(session_id, text, reserve=CHAT_MAX_TOKENS),
+            max_tokens=CHAT_MAX_TOKENS
         )
         reply = response.choices[0].message.content
-        self.chat_history.append({"role": "assistant", "content": reply})
+        self.chat_sessions.append(session_id, "assistant", reply)
         return reply
 
-    def extract_patient_info(self, text: str, current: dict) -> dict:
-        schema = {
-            "patient_name": None,
-            "age": None,
-            "gender": None,
-            "doctor_name": None,
-            "checkup_date": None,
-            "checkup_details": None,
-            "symptoms": [],
-            "diagnosis": None,
-            "medicines": [],
-            "notes": [],
-            "medical_tests": []
-        }
-        base = {**schema, **(current or {})}
+    async def achat_response(self, text: str, session_id: str = "default") -> str:
+        response = await self._acreate(
+            PRIORITY_INTERACTIVE,
+            messages=self.chat_sessions.messages(session_id, text, reserve=CHAT_MAX_TOKENS),
+            max_tokens=CHAT_MAX_TOKENS
+        )
+        reply = response.choices[0].message.content
+        self.chat_sessions.append(session_id, "assistant", reply)
+        return reply
+
+    async def astream_chat_response(self, text: str, session_id: str = "default"):
+        """Yield reply chunks; the full reply joins the session history once the stream ends."""
+        parts = []
+        async for piece in self._astream(
+            PRIORITY_INTERACTIVE,
+            messages=self.chat_sessions.messages(session_id, text, reserve=CHAT_MAX_TOKENS),
+            max_tokens=CHAT_MAX_TOKENS
+        ):
+            parts.append(piece)
+            yield piece
+        self.chat_sessions.append(session_id, "assistant", "".join(parts))
+
+    def _extraction_messages(self, text: str) -> list:
         prompt = (
             "Extract structured medical details from the user's input. "
             "Return ONLY valid JSON matching this schema keys: "
-            "patient_name, age, gender, doctor_name, checkup_date, checkup_details, symptoms, diagnosis, medicines, medical_tests, notes. "
-            "symptoms: array of strings. "
-            "medicines: array of objects with keys: name, dose, frequency. "
-            "medical_tests: array of objects with keys: name, optional details. "
-            "If a field is not mentioned, leave as null or empty array. "
-            "User input: "
+            + EXTRACTION_SCHEMA
+            + "User input: "
             + text
         )
+        return [
+            {"role": "system", "content": "You output ONLY JSON without extra text."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def extract_patient_info(self, text: str, current: dict) -> dict:
         resp = self.client.chat.completions.create(
-            model=os.getenv("OPENAI_MODEL"),
-            messages=[
-                {"role": "system", "content": "You output ONLY JSON without extra text."},
-                {"role": "user", "content": prompt}
-            ],
+            model=self.model,
+            messages=self._extraction_messages(text),
             max_tokens=400
         )
-        content = resp.choices[0].message.content or "{}"
+        return self._merge_extraction(resp.choices[0].message.content, current)
+
+    async def aextract_fields(self, text: str, priority: int = PRIORITY_INTERACTIVE) -> dict:
+        resp = await self._acreate(
+            priority,
+            messages=self._extraction_messages(text),
+            max_tokens=400
+        )
+        return parse_extraction(resp.choices[0].message.content)
+
+    async def aextract_patient_info(self, text: str, current: dict) -> dict:
+        data = await self.aextract_fields(text, PRIORITY_PRESCRIPTION)
+        record = PatientRecord.from_dict(current)
+        record.merge(data)
+        return record.to_dict()
+
+    def _merge_extraction(self, content: str, current: dict) -> dict:
+        record = PatientRecord.from_dict(current)
+        record.merge(parse_extraction(content))
+        return record.to_dict()
+
+
+def parse_extraction(content: str) -> dict:
+    with stage("extraction_parse"):
+        return _parse_extraction(content)
+
+
+def _parse_extraction(content: str) -> dict:
+    content = content or "{}"
+    try:
+        data = json.loads(content)
+    except Exception:
         try:
-            data = json.loads(content)
+            start = content.find("{")
+            end = content.rfind("}")
+            data = json.loads(content[start:end+1]) if start != -1 and end != -1 else {}
         except Exception:
-            try:
-                start = content.find("{")
-                end = content.rfind("}")
-                data = json.loads(content[start:end+1]) if start != -1 and end != -1 else {}
-            except Exception:
-                data = {}
-        merged = base.copy()
-        for k in merged.keys():
-            if k in data and data[k] is not None and data[k] != "":
-                if isinstance(merged[k], list) and isinstance(data[k], list):
-                    if k == "medicines":
-                        current_meds = merged[k]
-                        for new_med in data[k]:
-                            exists = False
-                            for med in current_meds:
-                                if med.get("name") and new_med.get("name") and med.get("name").lower() == new_med.get("name").lower():
-                                    med.update(new_med)
-                                    exists = True
-                                    break
-                            if not exists:
-                                current_meds.append(new_med)
-                        merged[k] = current_meds
-                    elif k == "medical_tests":
-                        current_tests = merged[k]
-                        for nt in data[k]:
-                            exists = False
-                            for ct in current_tests:
-                                if ct.get("name") and nt.get("name") and ct.get("name").lower() == nt.get("name").lower():
-                                    ct.update(nt)
-                                    exists = True
-                                    break
-                            if not exists:
-                                current_tests.append(nt)
-                        merged[k] = current_tests
-                    else:
-                        current_list = merged[k]
-                        for item in data[k]:
-                            if item not in current_list:
-                                current_list.append(item)
-                        merged[k] = current_list
-                else:
-                    merged[k] = data[k]
-        return merged
+            data = {}
+    return data if isinstance(data, dict) else {}
@@ -0,0 +1,182 @@
+SCALAR_FIELDS = (
+    "patient_name", "age", "gender", "doctor_name",
+    "checkup_date", "checkup_details", "diagnosis"
+)
+SET_FIELDS = ("symptoms", "notes")
+KEYED_FIELDS = ("medicines", "medical_tests")
+FIELDS = SCALAR_FIELDS + SET_FIELDS + KEYED_FIELDS
+
+
+def normalize_name(value) -> str:
+    return " ".join(str(value).lower().split())
+
+
+def _empty(value) -> bool:
+    return value is None or value == ""
+
+
+class PatientRecord:
+    """Consultation record with name indexes so every merge is an in-place upsert.
+
+    ``symptoms``/``notes`` are deduplicated on their normalized text and
+    ``medicines``/``medical_tests`` on their normalized ``name``; lookups go
+    through the ``_index`` dicts rather than scanning the lists. Keys that
+    are not part of the schema are carried through untouched in ``extra``.
+    """
+
+    __slots__ = FIELDS + ("extra", "version", "_index", "_delta", "_delta_base")
+
+    def __init__(self):
+        for k in SCALAR_FIELDS:
+            setattr(self, k, None)
+        for k in SET_FIELDS + KEYED_FIELDS:
+            setattr(self, k, [])
+        self.extra = {}
+        self.version = 0
+        self._index = {k: {} for k in SET_FIELDS + KEYED_FIELDS}
+        self._delta = {}
+        self._delta_base = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PatientRecord":
+        if isinstance(data, PatientRecord):
+            return data
+        record = cls()
+        data = data or {}
+        record.merge(data)
+        record.extra = {k: v for k, v in data.items() if k not in FIELDS}
+        record.version = 0
+        record._delta = {}
+        return record
+
+    @classmethod
+    def restore(cls, data: dict, version: int) -> "PatientRecord":
+        """Rebuild a persisted record at ``version`` with no pending delta."""
+        record = cls.from_dict(data)
+        record.version = record._delta_base = version
+        return record
+
+    def merge(self, data: dict) -> set:
+        """Upsert ``data`` into the record and return the names of fields that changed."""
+        changed = set()
+        if not data:
+            return changed
+        for k in SCALAR_FIELDS:
+            value = data.get(k)
+            if not _empty(value) and getattr(self, k) != value:
+                setattr(self, k, value)
+                self._delta[k] = value
+                changed.add(k)
+        for k in SET_FIELDS:
+            items = data.get(k)
+            if isinstance(items, list) and self._merge_set(k, items):
+                changed.add(k)
+        for k in KEYED_FIELDS:
+            items = data.get(k)
+            if isinstance(items, list) and self._merge_keyed(k, items):
+                changed.add(k)
+        if changed:
+            self.version += 1
+        return changed
+
+    def _merge_set(self, field: str, items: list) -> bool:
+        index = self._index[field]
+        target = getattr(self, field)
+        delta = self._delta.setdefault(field, [])
+        changed = False
+        for item in items:
+            if _empty(item):
+                continue
+            key = normalize_name(item) if isinstance(item, str) else repr(item)
+            if key not in index:
+                index[key] = len(target)
+                target.append(item)
+                delta.append(item)
+                changed = True
+        if not delta:
+            del self._delta[field]
+        return changed
+
+    def _merge_keyed(self, field: str, items: list) -> bool:
+        index = self._index[field]
+        target = getattr(self, field)
+        delta = self._delta.setdefault(field, {})
+        changed = False
+        for item in items:
+            if isinstance(item, str):
+                item = {"name": item}
+            if not isinstance(item, dict):
+                continue
+            name = item.get("name")
+            key = "" if _empty(name) else normalize_name(name)
+            if not key:
+                # Entries are keyed and patched by name; one without a name cannot be upserted.
+                continue
+            pos = index.get(key)
+            if pos is None:
+                pos = index[key] = len(target)
+                target.append(dict(item))
+                delta[key] = pos
+                changed = True
+                continue
+            existing = target[pos]
+            for ik, iv in item.items():
+                if ik != "name" and not _empty(iv) and existing.get(ik) != iv:
+                    existing[ik] = iv
+                    delta[key] = pos
+                    changed = True
+        if not delta:
+            del self._delta[field]
+        return changed
+
+    def take_delta(self):
+        """Return ``(base_version, version, patch)`` for everything merged since the last call.
+
+        The patch is a partial record: changed scalars, newly added set items
+        and the full current entry of every upserted medicine/test, so a client
+        can apply it with the same upsert-by-name merge it uses for records.
+        """
+        patch = {}
+        for k, v in self._delta.items():
+            if k in KEYED_FIELDS:
+                target = getattr(self, k)
+                v = [dict(target[pos]) for pos in v.values()]
+            patch[k] = v
+        base = self._delta_base
+        self._delta = {}
+        self._delta_base = self.version
+        return base, self.version, patch
+
+    def has(self, field: str, name) -> bool:
+        return normalize_name(name) in self._index[field]
+
+    def to_dict(self, fields=FIELDS) -> dict:
+        out = {**self.extra} if fields is FIELDS else {}
+        for k in fields:
+            value = getattr(self, k)
+            if k in KEYED_FIELDS:
+                value = [dict(item) for item in value]
+            elif k in SET_FIELDS:
+                value = list(value)
+            out[k] = value
+        return out
+
+
+def validate_fields(data) -> bool:
+    """True if ``data`` only uses schema fields with the expected shapes (all optional)."""
+    if not isinstance(data, dict):
+        return False
+    for k, v in data.items():
+        if k not in FIELDS or v is None:
+            continue
+        if k in SCALAR_FIELDS:
+            if not isinstance(v, (str, int, float)):
+                return False
+        elif not isinstance(v, list):
+            return False
+        elif k in SET_FIELDS:
+            if not all(isinstance(item, str) for item in v):
+                return False
+        elif not all(isinstance(item, str) or (isinstance(item, dict) and isinstance(item.get("name"), (str, type(None)))) for item in v):
+            return False
+    return True
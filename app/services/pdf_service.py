@@ -1,87 +1,244 @@
 import io
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.units import inch
+import os
+import re
+import time
+import asyncio
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from app.services.metrics import observe_stage
 
-def generate_pdf(body: dict) -> bytes:
+
+class ReportTemplate:
+    """Styles and static header/footer flowables, built once per process and reused by every render."""
+
+    def __init__(self):
+        # ReportLab is imported here, in the render workers, rather than by the web process at startup.
+        from reportlab.lib import colors
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+        styles = getSampleStyleSheet()
+        self.normal = styles['Normal']
+        self.header_style = ParagraphStyle('Header', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#2c3e50'), alignment=1, spaceAfter=10)
+        self.sub_header_style = ParagraphStyle('SubHeader', parent=styles['Normal'], fontSize=10, textColor=colors.HexColor('#7f8c8d'), alignment=1, spaceAfter=30)
+        self.section_header_style = ParagraphStyle('SectionHeader', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#34495e'), spaceBefore=15, spaceAfter=10, borderPadding=5, borderColor=colors.HexColor('#bdc3c7'), borderWidth=0, backColor=colors.HexColor('#ecf0f1'))
+        self.signature_style = ParagraphStyle('Signature', parent=styles['Normal'], alignment=2)
+        self.info_table_style = TableStyle([('BOX', (0,0), (-1,-1), 1, colors.HexColor('#bdc3c7')), ('INNERGRID', (0,0), (-1,-1), 0.5, colors.HexColor('#ecf0f1')), ('TOPPADDING', (0,0), (-1,-1), 8), ('BOTTOMPADDING', (0,0), (-1,-1), 8), ('LEFTPADDING', (0,0), (-1,-1), 12)])
+        self.grid_table_style = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 10),
+            ('BOTTOMPADDING', (0,0), (-1,0), 10),
+            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
+            ('GRID', (0,0), (-1,-1), 1, colors.HexColor('#bdc3c7')),
+            ('TOPPADDING', (0,0), (-1,-1), 8),
+            ('BOTTOMPADDING', (0,0), (-1,-1), 8)
+        ])
+        self.footer_table_style = TableStyle([('ALIGN', (0,-1), (-1,-1), 'RIGHT')])
+        self.header = [
+            Paragraph("PMS AI MEDICAL CENTER", self.header_style),
+            Paragraph("123 Health Avenue, Medical District, Tech City - 560001<br/>Phone: +91 98765 43210 | Email: contact@pms-ai.com", self.sub_header_style),
+            Spacer(1, 10),
+        ]
+        self.clinical_heading = Paragraph("Clinical Assessment", self.section_header_style)
+        self.tests_heading = Paragraph("Medical Tests", self.section_header_style)
+        self.rx_heading = Paragraph("Prescription / Rx", self.section_header_style)
+        self.no_tests = Paragraph("No medical tests recommended.", self.normal)
+        self.no_medicines = Paragraph("No medicines prescribed.", self.normal)
+        footer_data = [[Paragraph("<b>Notes:</b><br/>Take rest and drink plenty of water. Follow up after 5 days if symptoms persist.", self.normal)], [Spacer(1, 30)], [Paragraph("_______________________<br/><b>Dr. AI Assistant</b><br/>Chief Medical Officer", self.signature_style)]]
+        self.footer = Table(footer_data, colWidths=[7*inch])
+        self.footer.setStyle(self.footer_table_style)
+
+
+_template = None
+
+
+def get_template() -> ReportTemplate:
+    global _template
+    if _template is None:
+        _template = ReportTemplate()
+    return _template
+
+
+def report_timestamp(body: dict):
+    """The record's own ``report_timestamp`` (ISO 8601) if it carries a valid one."""
+    value = body.get("report_timestamp")
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+
+def generate_pdf(body: dict, generated_at: datetime = None) -> bytes:
+    """Render a report; output is byte-identical for the same ``body`` and ``generated_at``."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
+
+    generated_at = generated_at or report_timestamp(body) or datetime.now()
+    tpl = get_template()
+    normal = tpl.normal
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40)
-    styles = getSampleStyleSheet()
-    story = []
-    header_style = ParagraphStyle('Header', parent=styles['Heading1'], fontSize=24, textColor=colors.HexColor('#2c3e50'), alignment=1, spaceAfter=10)
-    sub_header_style = ParagraphStyle('SubHeader', parent=styles['Normal'], fontSize=10, textColor=colors.HexColor('#7f8c8d'), alignment=1, spaceAfter=30)
-    section_header_style = ParagraphStyle('SectionHeader', parent=styles['Heading2'], fontSize=14, textColor=colors.HexColor('#34495e'), spaceBefore=15, spaceAfter=10, borderPadding=5, borderColor=colors.HexColor('#bdc3c7'), borderWidth=0, backColor=colors.HexColor('#ecf0f1'))
-    story.append(Paragraph("PMS AI MEDICAL CENTER", header_style))
-    story.append(Paragraph("123 Health Avenue, Medical District, Tech City - 560001<br/>Phone: +91 98765 43210 | Email: contact@pms-ai.com", sub_header_style))
-    story.append(Spacer(1, 10))
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=40, leftMargin=40, topMargin=40, bottomMargin=40, invariant=1)
+    story = list(tpl.header)
     patient_data = [
-        [Paragraph(f"<b>Patient Name:</b> {body.get('patient_name') or 'N/A'}", styles['Normal']),
-         Paragraph(f"<b>Date:</b> {datetime.now().strftime('%d-%b-%Y')}", styles['Normal'])],
-        [Paragraph(f"<b>Age/Gender:</b> {body.get('age') or '--'} / {body.get('gender') or '--'}", styles['Normal']),
-         Paragraph(f"<b>Doctor:</b> {body.get('doctor_name') or 'Dr. AI Assistant'}", styles['Normal'])],
-        [Paragraph(f"<b>Patient ID:</b> #PMS-{datetime.now().strftime('%Y%m%d%H%M')}", styles['Normal']),
-         Paragraph(f"<b>Consultation Type:</b> General", styles['Normal'])],
+        [Paragraph(f"<b>Patient Name:</b> {body.get('patient_name') or 'N/A'}", normal),
+         Paragraph(f"<b>Date:</b> {generated_at.strftime('%d-%b-%Y')}", normal)],
+        [Paragraph(f"<b>Age/Gender:</b> {body.get('age') or '--'} / {body.get('gender') or '--'}", normal),
+         Paragraph(f"<b>Doctor:</b> {body.get('doctor_name') or 'Dr. AI Assistant'}", normal)],
+        [Paragraph(f"<b>Patient ID:</b> #PMS-{generated_at.strftime('%Y%m%d%H%M')}", normal),
+         Paragraph(f"<b>Consultation Type:</b> General", normal)],
     ]
     t_info = Table(patient_data, colWidths=[3.5*inch, 3.5*inch])
-    t_info.setStyle(TableStyle([('BOX', (0,0), (-1,-1), 1, colors.HexColor('#bdc3c7')), ('INNERGRID', (0,0), (-1,-1), 0.5, colors.HexColor('#ecf0f1')), ('TOPPADDING', (0,0), (-1,-1), 8), ('BOTTOMPADDING', (0,0), (-1,-1), 8), ('LEFTPADDING', (0,0), (-1,-1), 12)]))
+    t_info.setStyle(tpl.info_table_style)
     story.append(t_info)
     story.append(Spacer(1, 20))
-    story.append(Paragraph("Clinical Assessment", section_header_style))
+    story.append(tpl.clinical_heading)
     symptoms = body.get("symptoms") or []
     symptoms_text = ", ".join(symptoms) if symptoms else "No symptoms recorded."
-    story.append(Paragraph(f"<b>Symptoms Reported:</b><br/>{symptoms_text}", styles['Normal']))
+    story.append(Paragraph(f"<b>Symptoms Reported:</b><br/>{symptoms_text}", normal))
     story.append(Spacer(1, 10))
-    story.append(Paragraph(f"<b>Diagnosis:</b> {body.get('diagnosis') or 'Pending Evaluation'}", styles['Normal']))
+    story.append(Paragraph(f"<b>Diagnosis:</b> {body.get('diagnosis') or 'Pending Evaluation'}", normal))
     story.append(Spacer(1, 5))
-    story.append(Paragraph(f"<b>Checkup Details:</b> {body.get('checkup_details') or 'Routine checkup performed.'}", styles['Normal']))
+    story.append(Paragraph(f"<b>Checkup Details:</b> {body.get('checkup_details') or 'Routine checkup performed.'}", normal))
     story.append(Spacer(1, 20))
-    story.append(Paragraph("Medical Tests", section_header_style))
+    story.append(tpl.tests_heading)
     tests = body.get("medical_tests") or []
     if tests:
         test_data = [['Test Name', 'Details']]
         for t in tests:
             if isinstance(t, dict):
-                test_data.append([Paragraph(t.get("name") or "Unknown", styles['Normal']), t.get("details") or "--"])
+                test_data.append([Paragraph(t.get("name") or "Unknown", normal), t.get("details") or "--"])
             else:
-                test_data.append([Paragraph(str(t), styles['Normal']), "--"])
+                test_data.append([Paragraph(str(t), normal), "--"])
         t_tests = Table(test_data, colWidths=[3.5*inch, 3.5*inch])
-        t_tests.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-            ('ALIGN', (0,0), (-1,-1), 'LEFT'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,0), 10),
-            ('BOTTOMPADDING', (0,0), (-1,0), 10),
-            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
-            ('GRID', (0,0), (-1,-1), 1, colors.HexColor('#bdc3c7')),
-            ('TOPPADDING', (0,0), (-1,-1), 8),
-            ('BOTTOMPADDING', (0,0), (-1,-1), 8)
-        ]))
+        t_tests.setStyle(tpl.grid_table_style)
         story.append(t_tests)
     else:
-        story.append(Paragraph("No medical tests recommended.", styles['Normal']))
+        story.append(tpl.no_tests)
     story.append(Spacer(1, 20))
-    story.append(Paragraph("Prescription / Rx", section_header_style))
+    story.append(tpl.rx_heading)
     medicines = body.get("medicines") or []
     if medicines:
         med_data = [['Medicine Name', 'Dosage', 'Frequency', 'Duration']]
         for m in medicines:
-            med_data.append([Paragraph(m.get("name") or "Unknown", styles['Normal']), m.get("dose") or "--", m.get("frequency") or "--", m.get("duration") or "5 Days"])
+            med_data.append([Paragraph(m.get("name") or "Unknown", normal), m.get("dose") or "--", m.get("frequency") or "--", m.get("duration") or "5 Days"])
         t_meds = Table(med_data, colWidths=[3*inch, 1.5*inch, 1.5*inch, 1*inch])
-        t_meds.setStyle(TableStyle([('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')), ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke), ('ALIGN', (0,0), (-1,-1), 'LEFT'), ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'), ('FONTSIZE', (0,0), (-1,0), 10), ('BOTTOMPADDING', (0,0), (-1,0), 10), ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')), ('GRID', (0,0), (-1,-1), 1, colors.HexColor('#bdc3c7')), ('TOPPADDING', (0,0), (-1,-1), 8), ('BOTTOMPADDING', (0,0), (-1,-1), 8)]))
+        t_meds.setStyle(tpl.grid_table_style)
         story.append(t_meds)
     else:
-        story.append(Paragraph("No medicines prescribed.", styles['Normal']))
+        story.append(tpl.no_medicines)
     story.append(Spacer(1, 30))
     story.append(Spacer(1, 20))
-    footer_data = [[Paragraph("<b>Notes:</b><br/>Take rest and drink plenty of water. Follow up after 5 days if symptoms persist.", styles['Normal'])], [Spacer(1, 30)], [Paragraph("_______________________<br/><b>Dr. AI Assistant</b><br/>Chief Medical Officer", ParagraphStyle('Signature', parent=styles['Normal'], alignment=2))]]
-    t_footer = Table(footer_data, colWidths=[7*inch])
-    t_footer.setStyle(TableStyle([('ALIGN', (0,-1), (-1,-1), 'RIGHT')]))
-    story.append(t_footer)
+    story.append(tpl.footer)
     doc.build(story)
     pdf_bytes = buffer.getvalue()
     buffer.close()
     return pdf_bytes
+
+
+def _warm_worker():
+    get_template()
+
+
+_pool = None
+
+
+def _workers() -> int:
+    return int(os.getenv("REPORT_WORKERS", str(os.cpu_count() or 2)))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_workers(), initializer=_warm_worker)
+    return _pool
+
+
+async def warm_up():
+    """Start the render workers (each builds its template on start) before the first report."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _warm_worker) for _ in range(_workers())))
+
+
+def _generate_pdf_timed(body: dict, generated_at: datetime = None):
+    started = time.perf_counter()
+    return generate_pdf(body, generated_at), time.perf_counter() - started
+
+
+async def render_pdf_async(body: dict, generated_at: datetime = None) -> bytes:
+    loop = asyncio.get_running_loop()
+    pdf_bytes, seconds = await loop.run_in_executor(_get_pool(), _generate_pdf_timed, body, generated_at)
+    observe_stage("report_render", seconds)
+    return pdf_bytes
+
+
+def report_filename(index: int, body: dict) -> str:
+    name = re.sub(r"[^A-Za-z0-9]+", "_", str(body.get("patient_name") or "Patient")).strip("_") or "Patient"
+    return f"{index + 1:04d}_{name}.pdf"
+
+
+class _ZipSink:
+    """Write-only file object; ZipFile streams into it and the generator drains it."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+async def stream_reports_zip(records: list):
+    """Render ``records`` in parallel and yield a ZIP archive as each PDF completes.
+
+    A record that fails to render becomes a ``NNNN_error.txt`` entry instead of aborting the archive.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+
+    async def render(index, body):
+        try:
+            pdf_bytes, seconds = await loop.run_in_executor(pool, _generate_pdf_timed, body)
+            observe_stage("report_render", seconds)
+            return index, pdf_bytes, None
+        except Exception as e:
+            return index, None, e
+
+    tasks = [asyncio.ensure_future(render(i, body)) for i, body in enumerate(records)]
+    sink = _ZipSink()
+    try:
+        with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for done in asyncio.as_completed(tasks):
+                index, pdf_bytes, error = await done
+                if error is None:
+                    archive.writestr(report_filename(index, records[index]), pdf_bytes)
+                else:
+                    archive.writestr(f"{index + 1:04d}_error.txt", str(error))
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
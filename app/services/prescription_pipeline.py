@@ -0,0 +1,147 @@
+import os
+import io
+import time
+import asyncio
+import hashlib
+import zipfile
+from app.services.image_preprocess import prepare_image_async
+from app.services.analysis_cache import AnalysisCache
+from app.services.openai_client import PROMPT_VERSION
+from app.services.llm_scheduler import priority_override, PRIORITY_BATCH
+from app.services.upload_stream import Upload, UploadLimits, UploadRejected, UploadTooLarge, upload_from_bytes
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif", ".tif", ".tiff", ".heic")
+
+# Scans barely compress; a member that inflates more than this is refused before it is read.
+MAX_COMPRESSION_RATIO = 100
+
+
+def analysis_key(contents, ai_client) -> str:
+    """``contents`` is the image bytes or an ``Upload`` that was hashed while it was read."""
+    parts = (ai_client.model, PROMPT_VERSION, ai_client.fused_prescription)
+    if isinstance(contents, Upload):
+        return AnalysisCache.key_from_digest(contents.digest, *parts)
+    return AnalysisCache.make_key(contents, *parts)
+
+
+async def compute_analysis(ai_client, contents) -> dict:
+    image = await prepare_image_async(contents.source if isinstance(contents, Upload) else contents)
+    started = time.perf_counter()
+    fused = None
+    if ai_client.fused_prescription:
+        fused = await ai_client.aanalyze_prescription_fused(image)
+    if fused:
+        mode = "fused"
+        analysis, extracted_data = fused
+    else:
+        mode = "fallback" if ai_client.fused_prescription else "two_call"
+        analysis = await ai_client.aanalyze_prescription(image)
+        extracted_data = await ai_client.aextract_patient_info(analysis, {})
+    llm_ms = round((time.perf_counter() - started) * 1000, 2)
+    result = {
+        "analysis": analysis,
+        "extracted_data": extracted_data,
+        "preprocess": image.stats,
+        "llm": {"mode": mode, "ms": llm_ms},
+    }
+    if isinstance(contents, Upload):
+        result["upload"] = contents.stats()
+    return result
+
+
+async def analyze_contents(ai_client, contents, cache: AnalysisCache = None, bypass: bool = False):
+    """Analyze one image through the cache; returns ``(result, cache_status)``."""
+    if cache is None:
+        return await compute_analysis(ai_client, contents), "DISABLED"
+    return await cache.get_or_compute(
+        analysis_key(contents, ai_client), lambda: compute_analysis(ai_client, contents), bypass=bypass
+    )
+
+
+def is_archive(filename: str, head: bytes) -> bool:
+    return (filename or "").lower().endswith(".zip") or head.startswith(b"PK\x03\x04")
+
+
+def read_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, limits: UploadLimits) -> Upload:
+    if info.file_size > limits.max_bytes:
+        raise UploadTooLarge(f"{info.filename} is {info.file_size} bytes; the limit is {limits.max_bytes}")
+    if info.file_size > MAX_COMPRESSION_RATIO * max(info.compress_size, 1):
+        raise UploadTooLarge(f"{info.filename} expands more than {MAX_COMPRESSION_RATIO}x")
+    # The header sizes can lie; never inflate more than the cap.
+    try:
+        with archive.open(info) as f:
+            data = f.read(limits.max_bytes + 1)
+    except zipfile.BadZipFile as e:
+        raise UploadRejected(f"{info.filename}: {e}") from e
+    return upload_from_bytes(data, limits)
+
+
+def archive_members(source, limits: UploadLimits = None) -> list:
+    """Image entries of a ZIP archive (bytes or a file object) as ``(name, loader)`` pairs.
+
+    Members are read lazily and each must pass the same type, byte and pixel
+    checks as a single upload.
+    """
+    limits = limits or UploadLimits.from_env()
+    archive = zipfile.ZipFile(io.BytesIO(source) if isinstance(source, bytes) else source)
+    members = []
+    for info in archive.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith("__MACOSX/") or not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        members.append((name, lambda i=info: asyncio.to_thread(read_member, archive, i, limits)))
+    return members
+
+
+async def run_batch(ai_client, items: list, cache: AnalysisCache = None, skip=(), concurrency: int = None, bypass: bool = False):
+    """Analyze ``(filename, loader)`` items with at most ``concurrency`` in flight.
+
+    A loader returns image bytes or an ``Upload``, which is closed once analyzed.
+
+    Yields one result dict per item in completion order, then a summary. Items
+    whose SHA-256 is in ``skip`` are reported as skipped without any model
+    call; re-sending a partially failed batch is also cheap because finished
+    images come back from the analysis cache.
+    """
+    concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", "4"))
+    semaphore = asyncio.Semaphore(concurrency)
+    skip = set(skip)
+
+    async def one(index, filename, loader):
+        async with semaphore:
+            started = time.perf_counter()
+            line = {"index": index, "filename": filename}
+            contents = None
+            try:
+                contents = await loader()
+                line["sha256"] = contents.sha256 if isinstance(contents, Upload) else hashlib.sha256(contents).hexdigest()
+                if line["sha256"] in skip:
+                    line["status"] = "skipped"
+                    return line
+                result, status = await analyze_contents(ai_client, contents, cache, bypass)
+                line.update(status="ok", cache=status, result=result)
+            except Exception as e:
+                line.update(status="error", error=str(e))
+            finally:
+                if isinstance(contents, Upload):
+                    contents.close()
+            line["ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return line
+
+    # Tasks copy the context at creation, so every model call they make queues behind interactive work.
+    token = priority_override.set(PRIORITY_BATCH)
+    try:
+        tasks = [asyncio.ensure_future(one(i, name, loader)) for i, (name, loader) in enumerate(items)]
+    finally:
+        priority_override.reset(token)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    started = time.perf_counter()
+    try:
+        for done in asyncio.as_completed(tasks):
+            line = await done
+            counts[line["status"]] += 1
+            yield line
+    finally:
+        for task in tasks:
+            task.cancel()
+    yield {"summary": {"total": len(items), **counts, "seconds": round(time.perf_counter() - started, 3)}}
@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+from datetime import date, datetime
+from collections import OrderedDict
+
+
+def _prune(value):
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items()}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_prune(v) for v in value]
+    return value
+
+
+def record_key(body: dict) -> str:
+    """Hash of the record with empty fields dropped and keys sorted, so equivalent bodies collide."""
+    normalized = json.dumps(_prune(body), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def _today() -> date:
+    return date.today()
+
+
+class ReportCache:
+    """LRU of rendered PDFs bounded by total bytes, plus the timestamp pinned to each record key.
+
+    Pins outlive evicted PDFs (they are tiny), so a re-render after eviction
+    reproduces the same bytes and the same ETag. A pin lasts until the end of
+    the day it was made; after that the same record gets a fresh Date and
+    Patient ID, and its cached PDF is dropped.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_pins: int = 50_000):
+        self.max_bytes = max_bytes
+        self.max_pins = max_pins
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._pins = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "ReportCache":
+        return cls(max_bytes=int(os.getenv("REPORT_CACHE_BYTES", str(64 * 1024 * 1024))))
+
+    def pin(self, key: str, generated_at: datetime = None) -> datetime:
+        pinned = self._pins.get(key)
+        today = _today()
+        if pinned is None or pinned[1] != today:
+            pinned = self._pins[key] = ((generated_at or datetime.now()).replace(microsecond=0), today)
+            self._pins.move_to_end(key)
+            while len(self._pins) > self.max_pins:
+                self._pins.popitem(last=False)
+        else:
+            self._pins.move_to_end(key)
+        return pinned[0]
+
+    @staticmethod
+    def etag(key: str, generated_at: datetime) -> str:
+        return '"' + hashlib.sha256(f"{key}:{generated_at.isoformat()}".encode()).hexdigest()[:32] + '"'
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None:
+            pinned = self._pins.get(key)
+            if pinned is None or pinned[1] != _today():
+                del self._entries[key]
+                self.bytes -= len(entry[1])
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, etag: str, pdf_bytes: bytes):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old[1])
+        if len(pdf_bytes) > self.max_bytes:
+            return etag, pdf_bytes
+        self._entries[key] = (etag, pdf_bytes)
+        self.bytes += len(pdf_bytes)
+        while self.bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+        return etag, pdf_bytes
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "pins": len(self._pins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
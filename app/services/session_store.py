@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from app.services.patient_record import PatientRecord
+
+
+class VoiceSession:
+    __slots__ = ("session_id", "record", "deltas", "connections", "touched")
+
+    def __init__(self, session_id: str, record: PatientRecord, deltas=(), max_deltas: int = 200):
+        self.session_id = session_id
+        self.record = record
+        self.deltas = deque(deltas, maxlen=max_deltas)
+        self.connections = 0
+        self.touched = time.time()
+
+
+class SessionStore:
+    """Voice consultation records that outlive a websocket, and optionally the process.
+
+    Every PATCH sent to a client is kept in a short per-session log so a
+    reconnecting client receives only what it missed. With ``path`` set,
+    patches and the latest record are written behind to SQLite (WAL) in
+    batches every ``flush_interval`` seconds; any worker sharing the file
+    can pick a session up where another left off.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        ttl: float = 24 * 3600,
+        max_sessions: int = 1000,
+        max_deltas: int = 200,
+        flush_interval: float = 0.25,
+    ):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_deltas = max_deltas
+        self.flush_interval = flush_interval
+        self.resumed = 0
+        self.restored = 0
+        self.replayed = 0
+        self.snapshots = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self._sessions = OrderedDict()
+        self._pending = []
+        self._dirty = {}
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("PRAGMA busy_timeout=5000")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS voice_sessions "
+                "(session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, record TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS voice_deltas (session_id TEXT NOT NULL, version INTEGER NOT NULL, "
+                "base INTEGER NOT NULL, src TEXT NOT NULL, patch TEXT NOT NULL, PRIMARY KEY (session_id, version))"
+            )
+            expired = time.time() - ttl
+            self._db.execute(
+                "DELETE FROM voice_deltas WHERE session_id IN (SELECT session_id FROM voice_sessions WHERE updated < ?)",
+                (expired,),
+            )
+            self._db.execute("DELETE FROM voice_sessions WHERE updated < ?", (expired,))
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        return cls(
+            path=os.getenv("VOICE_SESSION_PATH") or None,
+            ttl=float(os.getenv("VOICE_SESSION_TTL", str(24 * 3600))),
+            max_sessions=int(os.getenv("VOICE_SESSION_MAX", "1000")),
+            max_deltas=int(os.getenv("VOICE_SESSION_MAX_DELTAS", "200")),
+            flush_interval=float(os.getenv("VOICE_SESSION_FLUSH", "0.25")),
+        )
+
+    def _disk_version(self, session_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT version FROM voice_sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def _load(self, session_id: str):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, record, updated FROM voice_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or row[2] < time.time() - self.ttl:
+                return None
+            deltas = self._db.execute(
+                "SELECT base, version, src, patch FROM voice_deltas WHERE session_id = ? ORDER BY version DESC LIMIT ?",
+                (session_id, self.max_deltas),
+            ).fetchall()
+        deltas = [{"v": v, "base": base, "src": src, "set": json.loads(patch)} for base, v, src, patch in reversed(deltas)]
+        return row[0], json.loads(row[1]), deltas
+
+    async def open(self, session_id: str) -> VoiceSession:
+        """Attach a connection to ``session_id``, restoring it from disk or starting it empty."""
+        session = self._sessions.get(session_id)
+        if session is not None and session.connections == 0 and self._db is not None:
+            # Another worker may have carried the session on since this copy was cached.
+            disk_version = await asyncio.to_thread(self._disk_version, session_id)
+            if disk_version is not None and disk_version > session.record.version:
+                session = None
+        if session is not None:
+            self.resumed += 1
+        else:
+            loaded = await asyncio.to_thread(self._load, session_id) if self._db is not None else None
+            if loaded is not None:
+                version, data, deltas = loaded
+                session = VoiceSession(session_id, PatientRecord.restore(data, version), deltas, self.max_deltas)
+                self.restored += 1
+            else:
+                session = VoiceSession(session_id, PatientRecord(), (), self.max_deltas)
+            self._sessions[session_id] = session
+        self._sessions.move_to_end(session_id)
+        session.connections += 1
+        session.touched = time.time()
+        self._evict()
+        return session
+
+    def _evict(self):
+        expired = time.time() - self.ttl
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            if len(self._sessions) <= self.max_sessions and session.touched >= expired:
+                break
+            if session.connections == 0 and session_id not in self._dirty:
+                del self._sessions[session_id]
+
+    def record_patch(self, session: VoiceSession, base: int, version: int, src: str, patch: dict):
+        """Log a PATCH that was sent for ``session`` and queue it for the next write-behind flush."""
+        delta = {"v": version, "base": base, "src": src, "set": patch}
+        session.deltas.append(delta)
+        session.touched = time.time()
+        if self._db is None:
+            return
+        self._pending.append((session.session_id, version, base, src, json.dumps(patch)))
+        self._dirty[session.session_id] = session
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def replay(self, session: VoiceSession, client_version: int):
+        """Deltas after ``client_version`` that chain onto it, or None when a SNAPSHOT is needed."""
+        missed = self._missed(session, client_version)
+        if missed is None:
+            self.snapshots += 1
+        else:
+            self.replayed += len(missed)
+        return missed
+
+    @staticmethod
+    def _missed(session: VoiceSession, client_version: int):
+        version = session.record.version
+        if client_version == version:
+            return []
+        if client_version <= 0 or client_version > version:
+            return None
+        missed = [d for d in session.deltas if d["v"] > client_version]
+        if not missed or missed[0]["base"] > client_version:
+            return None
+        for prev, delta in zip(missed, missed[1:]):
+            if delta["base"] != prev["v"]:
+                return None
+        return missed
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    def _write(self, deltas: list, snapshots: list):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO voice_deltas (session_id, version, base, src, patch) VALUES (?, ?, ?, ?, ?)",
+                deltas,
+            )
+            self._db.executemany(
+                "INSERT INTO voice_sessions (session_id, version, record, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET version = excluded.version, record = excluded.record, "
+                "updated = excluded.updated WHERE excluded.version >= voice_sessions.version",
+                snapshots,
+            )
+            self._db.executemany(
+                "DELETE FROM voice_deltas WHERE session_id = ? AND version <= ?",
+                [(session_id, version - self.max_deltas) for session_id, version, _, _ in snapshots],
+            )
+            self._db.commit()
+            self.flushes += 1
+            self.rows_written += len(deltas) + len(snapshots)
+
+    async def flush(self):
+        """Write queued patches and the current record of every touched session in one transaction."""
+        if self._db is None:
+            return
+        # Serialised so a caller returns only once everything queued before it is on disk.
+        async with self._flush_lock:
+            if not (self._pending or self._dirty):
+                return
+            deltas, self._pending = self._pending, []
+            now = time.time()
+            snapshots = [
+                (s.session_id, s.record.version, json.dumps(s.record.to_dict()), now) for s in self._dirty.values()
+            ]
+            self._dirty = {}
+            await asyncio.to_thread(self._write, deltas, snapshots)
+
+    async def release(self, session: VoiceSession):
+        """Detach a connection; its state is flushed so another worker can resume it straight away."""
+        session.connections -= 1
+        session.touched = time.time()
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "connected": sum(1 for s in self._sessions.values() if s.connections),
+            "persistent": self._db is not None,
+            "resumed": self.resumed,
+            "restored": self.restored,
+            "replayed_patches": self.replayed,
+            "snapshots": self.snapshots,
+            "pending_rows": len(self._pending) + len(self._dirty),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+        }
+
+    async def close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,122 @@
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class PageVersion:
+    __slots__ = ("mtime_ns", "size", "etag", "last_modified", "bodies")
+
+    def __init__(self, data: bytes, mtime_ns: int, size: int):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        # Weak: the gzip/br variants carry the same validator.
+        self.etag = 'W/"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        self.last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+        self.bodies = {"identity": data, "gzip": gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(data, quality=11)
+
+    def not_modified(self, if_none_match: str = None, if_modified_since: str = None) -> bool:
+        if if_none_match:
+            tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+            return "*" in tags or self.etag.removeprefix("W/") in tags
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= self.mtime_ns // 1_000_000_000
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """Best of ``available`` for an Accept-Encoding header; br beats gzip at equal q."""
+    if not accept_encoding:
+        return "identity"
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    best, best_q = "identity", weights.get("identity", weights.get("*", 0.001))
+    for name in ("gzip", "br"):
+        q = weights.get(name, weights.get("*", 0.0))
+        if name in available and q > 0 and q >= best_q:
+            best, best_q = name, q
+    return best
+
+
+class StaticPage:
+    """A file kept in memory with precompressed variants, reloaded when its mtime or size changes.
+
+    The file is stat'ed at most once per ``check_interval`` seconds (never
+    again when negative), and a reload happens off the event loop.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.loads = 0
+        self.not_modified = 0
+        self.served = {}
+        self._version = None
+        self._checked = 0.0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, path: str = "templates/index.html") -> "StaticPage":
+        return cls(path, check_interval=float(os.getenv("STATIC_RELOAD_INTERVAL", "1.0")))
+
+    def load(self) -> PageVersion:
+        st = os.stat(self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self._version = PageVersion(data, st.st_mtime_ns, st.st_size)
+        self._checked = time.monotonic()
+        self.loads += 1
+        return self._version
+
+    def _stale(self) -> bool:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_mtime_ns, st.st_size) != (self._version.mtime_ns, self._version.size)
+
+    async def current(self) -> PageVersion:
+        version = self._version
+        if version is not None:
+            if self.check_interval < 0 or time.monotonic() - self._checked < self.check_interval:
+                return version
+            self._checked = time.monotonic()
+            if not self._stale():
+                return version
+        async with self._lock:
+            if self._version is version:
+                await asyncio.to_thread(self.load)
+            return self._version
+
+    def count(self, encoding: str):
+        self.served[encoding] = self.served.get(encoding, 0) + 1
+
+    def stats(self) -> dict:
+        version = self._version
+        return {
+            "loads": self.loads,
+            "not_modified": self.not_modified,
+            "served": dict(self.served),
+            "bytes": {k: len(v) for k, v in version.bodies.items()} if version else {},
+        }
@@ -0,0 +1,81 @@
+from app.services.fast_extract import MATCHER, TOKEN_RE, scan
+from app.services.patient_record import PatientRecord
+
+# Tokens re-read before the appended text so terms and "name is ..." phrases
+# split across two interim results still match.
+TAIL_TOKENS = 4
+
+
+class Segment:
+    """Rule matches for one speech-recognition result while it is still interim.
+
+    Hits live in a scratch record of their own, so they stay provisional and
+    never touch the consultation record until the final text arrives.
+    """
+
+    __slots__ = ("text", "record", "scanned_chars")
+
+    def __init__(self):
+        self.text = ""
+        self.record = PatientRecord()
+        self.scanned_chars = 0
+
+    def feed(self, text: str):
+        """Scan what was appended since the last interim. Returns ``(changed, reset)``."""
+        reset = not text.startswith(self.text)
+        if reset:
+            self.record = PatientRecord()
+            start = 0
+        else:
+            start = self._resume_offset()
+        self.text = text
+        self.scanned_chars += len(text) - start
+        return self.record.merge(scan(text[start:])[0]), reset
+
+    def _resume_offset(self) -> int:
+        window = max(TAIL_TOKENS, MATCHER.depth)
+        tail = max(0, len(self.text) - 32 * window)
+        starts = [m.start() for m in TOKEN_RE.finditer(self.text[tail:].lower())]
+        return tail + starts[-window] if len(starts) >= window else tail
+
+    def provisional(self, fields=None) -> dict:
+        return self.record.to_dict(fields) if fields is not None else {
+            k: v for k, v in self.record.to_dict().items() if v
+        }
+
+
+class SegmentTracker:
+    """Open interim segments of one websocket connection, keyed by client segment id."""
+
+    def __init__(self, max_open: int = 32):
+        self.max_open = max_open
+        self._segments = {}
+        self.interim = 0
+        self.finals = 0
+        self.scanned_chars = 0
+        self.full_chars = 0
+
+    def interim_update(self, seg_id, text: str):
+        """Returns ``(provisional fields that changed, reset)`` for an interim result."""
+        segment = self._segments.get(seg_id)
+        if segment is None:
+            if len(self._segments) >= self.max_open:
+                self._segments.pop(next(iter(self._segments)))
+            segment = self._segments[seg_id] = Segment()
+        before = segment.scanned_chars
+        changed, reset = segment.feed(text)
+        self.interim += 1
+        self.scanned_chars += segment.scanned_chars - before
+        self.full_chars += len(text)
+        if reset:
+            return segment.provisional(), True
+        return segment.provisional(changed) if changed else {}, False
+
+    def finish(self, seg_id) -> bool:
+        """Drop the interim state of a segment once its final text arrives."""
+        self.finals += 1
+        return self._segments.pop(seg_id, None) is not None
+
+    @property
+    def open(self) -> int:
+        return len(self._segments)
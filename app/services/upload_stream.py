@@ -0,0 +1,245 @@
+import io
+import os
+import json
+import time
+import hashlib
+import tempfile
+from app.services.image_preprocess import load_pil
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the formats PIL decodes for us; anything else is refused before it is decoded.
+SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+
+
+class UploadRejected(ValueError):
+    status_code = 400
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = 413
+
+
+class UnsupportedUpload(UploadRejected):
+    status_code = 415
+
+
+def sniff(head: bytes):
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, kind in SIGNATURES:
+        if head.startswith(signature):
+            return kind
+    return None
+
+
+class UploadLimits:
+    __slots__ = ("max_bytes", "spool_bytes", "max_pixels")
+
+    def __init__(self, max_bytes: int = 20 * 1024 * 1024, spool_bytes: int = 2 * 1024 * 1024, max_pixels: int = 50_000_000):
+        self.max_bytes = max_bytes
+        self.spool_bytes = spool_bytes
+        self.max_pixels = max_pixels
+
+    @classmethod
+    def from_env(cls) -> "UploadLimits":
+        return cls(
+            max_bytes=int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024))),
+            spool_bytes=int(os.getenv("UPLOAD_SPOOL_BYTES", str(2 * 1024 * 1024))),
+            max_pixels=int(os.getenv("UPLOAD_MAX_PIXELS", "50000000")),
+        )
+
+
+class Upload:
+    """One image upload: bytes in memory when small, otherwise a temp file the image workers open by path."""
+
+    __slots__ = ("data", "path", "size", "digest", "format", "width", "height", "read_ms")
+
+    def __init__(self, data, path, size, digest, format, width, height, read_ms):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.digest = digest
+        self.format = format
+        self.width = width
+        self.height = height
+        self.read_ms = read_ms
+
+    @property
+    def source(self):
+        return self.data if self.data is not None else self.path
+
+    @property
+    def sha256(self) -> str:
+        return self.digest.hexdigest()
+
+    def read(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def stats(self) -> dict:
+        return {"bytes": self.size, "spooled": self.path is not None, "format": self.format,
+                "width": self.width, "height": self.height, "read_ms": self.read_ms}
+
+    def close(self):
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def _check_pixels(fp, kind: str, limits: UploadLimits):
+    """Header-only open: the pixel count is known before a single scanline is decoded."""
+    Image = load_pil()
+    try:
+        with Image.open(fp, formats=[kind]) as image:
+            width, height = image.size
+    except Image.DecompressionBombError as e:
+        raise UploadTooLarge(str(e)) from e
+    except Exception as e:
+        raise UploadRejected(f"Unreadable {kind} image: {e}") from e
+    if width * height > limits.max_pixels:
+        raise UploadTooLarge(f"Image is {width}x{height}; the limit is {limits.max_pixels} pixels")
+    return width, height
+
+
+async def read_upload(file, limits: UploadLimits = None) -> Upload:
+    """Read an ``UploadFile`` in chunks: sniff the type, enforce the byte and pixel caps, hash as it goes.
+
+    Bytes past ``limits.spool_bytes`` go to a temp file instead of memory.
+    The caller owns the result and must ``close()`` it.
+    """
+    limits = limits or UploadLimits.from_env()
+    started = time.perf_counter()
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spool = None
+    size = 0
+    kind = None
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if kind is None:
+                kind = sniff(bytes(buffer[:16]) + chunk[:16])
+                if kind is None:
+                    raise UnsupportedUpload("Upload is not a JPEG, PNG, WEBP, GIF, BMP or TIFF image")
+            size += len(chunk)
+            if size > limits.max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {limits.max_bytes} bytes")
+            digest.update(chunk)
+            if spool is None and size > limits.spool_bytes:
+                spool = tempfile.NamedTemporaryFile(prefix="pms-upload-", suffix="." + kind.lower(), delete=False)
+                spool.write(buffer)
+                buffer = None
+            if spool is not None:
+                spool.write(chunk)
+            else:
+                buffer += chunk
+        if kind is None:
+            raise UploadRejected("Empty upload")
+        if spool is not None:
+            spool.close()
+            with open(spool.name, "rb") as f:
+                width, height = _check_pixels(f, kind, limits)
+            data, path = None, spool.name
+        else:
+            data, path = bytes(buffer), None
+            width, height = _check_pixels(io.BytesIO(data), kind, limits)
+    except BaseException:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        raise
+    return Upload(data, path, size, digest, kind, width, height, round((time.perf_counter() - started) * 1000, 2))
+
+
+def upload_from_bytes(data: bytes, limits: UploadLimits = None) -> Upload:
+    """The checks ``read_upload`` makes, for bytes already in memory (e.g. a ZIP member)."""
+    limits = limits or UploadLimits.from_env()
+    started = time.perf_counter()
+    if not data:
+        raise UploadRejected("Empty upload")
+    if len(data) > limits.max_bytes:
+        raise UploadTooLarge(f"Upload exceeds {limits.max_bytes} bytes")
+    kind = sniff(data[:16])
+    if kind is None:
+        raise UnsupportedUpload("Upload is not a JPEG, PNG, WEBP, GIF, BMP or TIFF image")
+    width, height = _check_pixels(io.BytesIO(data), kind, limits)
+    return Upload(data, None, len(data), hashlib.sha256(data), kind, width, height, round((time.perf_counter() - started) * 1000, 2))
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI guard: refuses request bodies over ``max_bytes`` on single-image ``paths`` with 413.
+
+    A too-large ``Content-Length`` is refused before any body is read; a
+    chunked body is cut off as soon as it crosses the limit, so the multipart
+    parser never spools more than the cap.
+    """
+
+    def __init__(self, app, max_bytes: int = None, paths=("/analyze-prescription", "/analyze-prescription/stream")):
+        self.app = app
+        # Multipart framing on top of the largest allowed file.
+        self.max_bytes = max_bytes if max_bytes is not None else UploadLimits.from_env().max_bytes + 64 * 1024
+        self.paths = frozenset(paths)
+
+    async def _reject(self, send):
+        body = json.dumps({"error": f"Request body exceeds {self.max_bytes} bytes"}).encode()
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                                (b"connection", b"close")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(send)
+            return
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge("Request body too large")
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # The body parser turns our error into its own 400; answer 413 in its place.
+            if exceeded:
+                if not started:
+                    started = True
+                    await self._reject(send)
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            if started:
+                raise
+            await self._reject(send)
@@ -0,0 +1,54 @@
+import os
+import time
+import asyncio
+from app.services import image_preprocess, pdf_service
+from app.services.metrics import observe_stage
+
+
+def _warm_extraction():
+    from app.services.fast_extract import scan
+    from app.services.lexicon import get_lexicon
+
+    get_lexicon().lookup("paracetamol")
+    scan("patient name is ravi, age 45 years, fever and cough, paracetamol 500 mg twice daily for 5 days, cbc")
+
+
+async def warm_up(app) -> dict:
+    """Pay the first-request costs up front: LLM connection pool, render and image workers, lexicon, index page.
+
+    Steps run concurrently; each one's seconds are returned and observed as
+    ``warmup_<step>`` stages. A failing step is reported and skipped.
+    """
+    steps = {
+        "report_workers": pdf_service.warm_up,
+        "image_workers": image_preprocess.warm_up,
+        "lexicon": lambda: asyncio.to_thread(_warm_extraction),
+    }
+    ai_client = getattr(app.state, "ai_client", None)
+    if ai_client:
+        steps["llm_pool"] = ai_client.warm_up
+    page = getattr(app.state, "index_page", None)
+    if page is not None:
+        steps["index_page"] = page.current
+    timings = {}
+
+    async def run(name, step):
+        started = time.perf_counter()
+        try:
+            await step()
+        except Exception as e:
+            print(f"Warning: warm-up step {name} failed. {e}")
+            return
+        timings[name] = time.perf_counter() - started
+        observe_stage(f"warmup_{name}", timings[name])
+
+    await asyncio.gather(*(run(name, step) for name, step in steps.items()))
+    return timings
+
+
+def warmup_mode() -> str:
+    """``WARMUP``: ``0`` (default) off, ``1`` before serving, ``background`` alongside the first requests."""
+    mode = os.getenv("WARMUP", "0").lower()
+    if mode in ("1", "true", "yes"):
+        return "blocking"
+    return "background" if mode == "background" else "off"
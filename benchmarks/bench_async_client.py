@@ -0,0 +1,55 @@
+"""Concurrent extraction throughput: blocking client vs pooled async client.
+
+    python -m benchmarks.bench_async_client --sessions 50 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.mock_llm import MockLLMServer
+
+
+async def run_sync(client, sessions: int) -> float:
+    async def one(i):
+        client.extract_patient_info(f"patient {i} has fever", {})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sessions)))
+    return time.perf_counter() - start
+
+
+async def run_async(client, sessions: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(client.aextract_patient_info(f"patient {i} has fever", {}) for i in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = MockLLMServer(latency=args.latency).start_in_thread()
+    os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_MODEL"] = "mock"
+    from app.services.openai_client import OpenAIClient
+
+    client = OpenAIClient()
+
+    async def bench():
+        sync_t = await run_sync(client, args.sessions)
+        async_t = await run_async(client, args.sessions)
+        await client.aclose()
+        return sync_t, async_t
+
+    sync_t, async_t = asyncio.run(bench())
+    print(f"sessions={args.sessions} latency={args.latency}s")
+    print(f"sync  client: {sync_t:.2f}s  {args.sessions / sync_t:.1f} req/s")
+    print(f"async client: {async_t:.2f}s  {args.sessions / async_t:.1f} req/s  ({sync_t / async_t:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Back-catalogue ingestion throughput: sequential single uploads vs the NDJSON batch endpoint.
+
+    python -m benchmarks.bench_batch_ingest --images 40 --latency 0.5 --concurrency 8
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_prescription_modes import FUSED_REPLY
+from benchmarks.bench_streaming import serve
+from benchmarks.mock_llm import MockLLMServer
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+
+
+def images(count: int, salt: str) -> list:
+    # Trailing bytes after the JPEG EOI marker are ignored by decoders but make every hash unique.
+    data = FIXTURE.read_bytes()
+    return [(f"{salt}-{i}.jpg", data + f"{salt}-{i}".encode()) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+    mock = MockLLMServer(latency=args.latency, reply=FUSED_REPLY).start_in_thread()
+    os.environ.update(OPENAI_API_KEY="mock", OPENAI_MODEL="mock", OPENAI_BASE_URL=mock.base_url,
+                      ANALYSIS_CACHE_PATH="", BATCH_CONCURRENCY=str(args.concurrency))
+    import main as server_main
+
+    base = f"http://{serve(server_main.app)}"
+    with httpx.Client(base_url=base, timeout=600) as client:
+        start = time.perf_counter()
+        for name, data in images(args.images, "seq"):
+            client.post("/analyze-prescription", files={"file": (name, data, "image/jpeg")}).raise_for_status()
+        sequential = time.perf_counter() - start
+
+        files = [("files", (name, data, "image/jpeg")) for name, data in images(args.images, "batch")]
+        start = time.perf_counter()
+        first = None
+        ok = 0
+        with client.stream("POST", "/analyze-prescription/batch", files=files) as resp:
+            for line in resp.iter_lines():
+                row = json.loads(line)
+                if first is None:
+                    first = time.perf_counter() - start
+                ok += row.get("status") == "ok"
+        batch = time.perf_counter() - start
+
+    print(f"images={args.images} model_latency={args.latency}s concurrency={args.concurrency}")
+    print(f"sequential singles: {sequential:6.2f}s  {args.images / sequential:6.2f} images/s")
+    print(f"batch ndjson      : {batch:6.2f}s  {ok / batch:6.2f} images/s  first line after {first:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""How many LLM extraction calls the coverage gate avoids at different thresholds.
+
+    python -m benchmarks.bench_coverage_gate --thresholds 0.5,0.7,0.8,0.9,1.0
+"""
+import argparse
+import time
+
+from app.services.fast_extract import CoverageGate, scan
+
+# A consultation dictated in short pieces, the way speech recognition delivers it.
+UTTERANCES = [
+    "patient name is ravi kumar",
+    "45 years male",
+    "fever and cough since three days",
+    "mild headache and fatigue",
+    "paracetamol 500 mg twice daily",
+    "azithromycin 500 mg once daily after food",
+    "cbc and x-ray chest",
+    "lipid profile thyroid",
+    "diagnosis: viral fever",
+    "bp 130 by 90 pulse 82",
+    "seen by doctor sharma today",
+    "advised rest and plenty of fluids",
+    "follow up after one week",
+    "no known drug allergies",
+    "vomiting since morning",
+    "age 45 years",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--thresholds", default="0.5,0.7,0.8,0.9,1.0")
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    coverages = [scan(u)[1] for u in UTTERANCES]
+    for u, c in zip(UTTERANCES, coverages):
+        print(f"  {c.score:5.2f}  {','.join(sorted(c.llm_fields)) or '-':22}  {u}")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        gate = CoverageGate(threshold)
+        for c in coverages:
+            gate.needs_llm(c)
+        s = gate.stats()
+        print(f"threshold {threshold:.2f}: {s['llm_avoided']}/{s['checked']} LLM calls avoided ({s['avoided_ratio']:.0%})")
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for u in UTTERANCES:
+            scan(u)
+    per_call = (time.perf_counter() - start) / (args.rounds * len(UTTERANCES)) * 1e6
+    print(f"scan with coverage: {per_call:.1f} us/utterance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Bytes per websocket update over a long consultation: full-record resends vs PATCH deltas.
+
+    python -m benchmarks.bench_delta_updates --utterances 300
+"""
+import argparse
+import json
+import time
+
+from app.services.fast_extract import quick_extract_into
+from app.services.patient_record import PatientRecord
+from app.services.wire import dumps
+
+
+def utterance(i: int) -> str:
+    return f"medicine{i} {100 + i} mg twice, complains of fever, advise cbc, symptom{i}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=300)
+    args = parser.parse_args()
+    record = PatientRecord()
+    checkpoints = {1, 10, 100, args.utterances}
+    print(f"{'update':>7} {'full_bytes':>11} {'patch_bytes':>12} {'full_parse_us':>14} {'patch_parse_us':>15}")
+    for i in range(1, args.utterances + 1):
+        quick_extract_into(utterance(i), record)
+        record.merge({"symptoms": [f"symptom{i}"]})
+        base, version, patch = record.take_delta()
+        full = "DATA_UPDATE:" + json.dumps(record.to_dict())
+        delta = "PATCH:" + dumps({"v": version, "base": base, "src": "fast", "set": patch})
+        if i in checkpoints:
+            parse = []
+            for msg, prefix in ((full, 12), (delta, 6)):
+                start = time.perf_counter()
+                for _ in range(200):
+                    json.loads(msg[prefix:])
+                parse.append((time.perf_counter() - start) / 200 * 1e6)
+            print(f"{i:>7} {len(full):>11} {len(delta):>12} {parse[0]:>14.1f} {parse[1]:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
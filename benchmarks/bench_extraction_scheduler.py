@@ -0,0 +1,68 @@
+"""LLM calls and time-to-consistent-record for a fast talker, per-utterance tasks vs scheduler.
+
+    python -m benchmarks.bench_extraction_scheduler --utterances 40 --gap 0.15 --latency 0.8
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from app.services.extraction_scheduler import ExtractionScheduler
+
+
+async def naive(utterances: int, gap: float, latency: float):
+    calls = 0
+    done = []
+
+    async def task(i):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        done.append((time.perf_counter(), i))
+
+    tasks = []
+    for i in range(utterances):
+        tasks.append(asyncio.create_task(task(i)))
+        await asyncio.sleep(gap)
+    last_spoken = time.perf_counter()
+    await asyncio.gather(*tasks)
+    # The record is only consistent once the update for the last utterance is the last one applied.
+    in_order = [i for _, i in sorted(done)]
+    consistent_at = max(t for t, _ in done)
+    return calls, consistent_at - last_spoken, in_order[-1] != utterances - 1
+
+
+async def scheduled(utterances: int, gap: float, latency: float):
+    applied = []
+
+    async def extract(text):
+        await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        return text
+
+    async def on_update(seq, res):
+        applied.append(time.perf_counter())
+
+    scheduler = ExtractionScheduler(extract, on_update, debounce=gap * 2)
+    for i in range(utterances):
+        scheduler.submit(f"utterance {i}")
+        await asyncio.sleep(gap)
+    last_spoken = time.perf_counter()
+    while scheduler.pending:
+        await asyncio.sleep(0.01)
+    return scheduler.calls, applied[-1] - last_spoken, False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--utterances", type=int, default=40)
+    parser.add_argument("--gap", type=float, default=0.15)
+    parser.add_argument("--latency", type=float, default=0.8)
+    args = parser.parse_args()
+    random.seed(0)
+    for name, fn in (("per-utterance", naive), ("scheduler", scheduled)):
+        calls, lag, out_of_order = asyncio.run(fn(args.utterances, args.gap, args.latency))
+        print(f"{name:14s} llm_calls={calls:3d} consistent_after={lag:.2f}s out_of_order_tail={out_of_order}")
+
+
+if __name__ == "__main__":
+    main()
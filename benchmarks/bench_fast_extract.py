@@ -0,0 +1,63 @@
+"""Per-utterance quick_extract latency as the symptom/test vocabulary grows.
+
+    python -m benchmarks.bench_fast_extract --sizes 25,1000,5000,20000
+"""
+import argparse
+import random
+import string
+import time
+
+from app.services import fast_extract
+
+UTTERANCES = [
+    "patient name is ravi kumar 45 years male",
+    "complaining of fever and cough since three days with mild headache",
+    "paracetamol 500 mg twice daily after food",
+    "advise cbc lipid profile and x-ray chest, the doctor will review",
+    "diagnosis: viral fever, follow up with thyroid and vitamin d",
+]
+
+
+def synthetic_terms(n: int) -> list:
+    rng = random.Random(n)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(n)]
+    return [w if i % 3 else w + " " + words[i - 1] for i, w in enumerate(words)]
+
+
+def naive_scan(text: str, vocab: list) -> list:
+    t = text.lower()
+    return [w for w in vocab if w in t]
+
+
+def per_call_us(fn, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for u in UTTERANCES:
+            fn(u)
+    return (time.perf_counter() - start) / (rounds * len(UTTERANCES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="25,1000,5000,20000")
+    parser.add_argument("--rounds", type=int, default=400)
+    args = parser.parse_args()
+    base_vocab = fast_extract.SYMPTOM_WORDS + fast_extract.TEST_WORDS
+    added = 0
+    print(f"{'terms':>7} {'quick_extract_us':>17} {'batch_us':>9} {'naive_scan_us':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        extra = synthetic_terms(max(size - len(base_vocab), 0))
+        fast_extract.MATCHER.add_many(extra[added:], "symptom")
+        added = max(added, len(extra))
+        vocab = base_vocab + extra
+        quick = per_call_us(lambda u: fast_extract.quick_extract(u, {}), args.rounds)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            fast_extract.quick_extract_batch(UTTERANCES)
+        batch = (time.perf_counter() - start) / (args.rounds * len(UTTERANCES)) * 1e6
+        naive = per_call_us(lambda u: naive_scan(u, vocab), max(args.rounds // 20, 5))
+        print(f"{fast_extract.MATCHER.size:>7} {quick:>17.1f} {batch:>9.1f} {naive:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Upload payload size and CPU time: legacy PNG re-encode vs the preprocessing pipeline.
+
+Uses the bundled pms.jpg plus a 12 MP upscale of it to stand in for a phone photo.
+
+    python -m benchmarks.bench_image_preprocess
+"""
+import argparse
+import base64
+import io
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.services.image_preprocess import PreprocessOptions, prepare_image
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+
+
+def legacy_png(data: bytes) -> bytes:
+    image = Image.open(io.BytesIO(data))
+    buffered = io.BytesIO()
+    image.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def phone_photo(data: bytes) -> bytes:
+    image = Image.open(io.BytesIO(data)).resize((3024, 4032), Image.BICUBIC)
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+def timed(fn, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return result, (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    original = FIXTURE.read_bytes()
+    variants = {
+        "jpeg gray q80": PreprocessOptions(),
+        "webp gray q80": PreprocessOptions(format="WEBP"),
+        "jpeg color q80": PreprocessOptions(grayscale=False),
+    }
+    for label, data in (("pms.jpg", original), ("12MP photo", phone_photo(original))):
+        print(f"== {label}: {len(data)} bytes")
+        png, ms = timed(lambda: legacy_png(data), args.rounds)
+        print(f"{'legacy png':>16} {len(png):>9} B  b64 {len(base64.b64encode(png)):>9} B  {ms:7.1f} ms")
+        for name, options in variants.items():
+            prepared, ms = timed(lambda: prepare_image(data, options), args.rounds)
+            stages = " ".join(f"{k[:-3]}={v}" for k, v in prepared.stats.items() if k.endswith("_ms") and k != "total_ms")
+            print(f"{name:>16} {len(prepared.data):>9} B  b64 {len(base64.b64encode(prepared.data)):>9} B  {ms:7.1f} ms  [{stages}]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Requests/s for GET / : reading the template per request vs the cached, precompressed page.
+
+    python -m benchmarks.bench_index_page --duration 5 --concurrency 16
+
+Over HTTP on a single machine the client usually saturates first, so the
+handler-only pass (direct ASGI calls, no sockets) shows the server-side cost.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse
+
+from app.api.routes import root
+from app.services.static_page import StaticPage
+from benchmarks.bench_streaming import serve
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def get():
+        with open("templates/index.html", "r", encoding="utf-8") as f:
+            html_content = f.read()
+        return HTMLResponse(content=html_content, status_code=200)
+
+    return app
+
+
+def cached_app() -> FastAPI:
+    app = FastAPI()
+    app.state.index_page = StaticPage.from_env()
+    app.include_router(root.router)
+    return app
+
+
+async def hammer(host: str, headers: dict, duration: float, concurrency: int):
+    done = 0
+    received = 0
+    async with httpx.AsyncClient(base_url=f"http://{host}", limits=httpx.Limits(max_connections=concurrency)) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal done, received
+            while time.perf_counter() < stop_at:
+                # Raw bytes as sent; httpx would otherwise spend client CPU decompressing.
+                async with client.stream("GET", "/", headers=headers) as resp:
+                    async for chunk in resp.aiter_raw():
+                        received += len(chunk)
+                    assert resp.status_code in (200, 304), resp.status_code
+                done += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return done / elapsed, received / max(done, 1)
+
+
+async def asgi_rate(app, headers: dict, duration: float) -> float:
+    raw = [(k.lower().encode(), v.encode()) for k, v in headers.items()]
+    scope = {"type": "http", "http_version": "1.1", "method": "GET", "path": "/", "raw_path": b"/",
+             "query_string": b"", "headers": raw, "scheme": "http", "server": ("test", 80), "client": ("test", 1),
+             "root_path": "", "app": app}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(dict(scope), receive, send)
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        for _ in range(100):
+            await app(dict(scope), receive, send)
+        done += 100
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    apps = {"legacy": legacy_app(), "cached": cached_app()}
+    legacy = serve(apps["legacy"])
+    cached = serve(apps["cached"])
+    etag = httpx.get(f"http://{cached}/").headers["etag"]
+    cases = [
+        ("legacy read-per-request", legacy, {"Accept-Encoding": "identity"}),
+        ("cached identity", cached, {"Accept-Encoding": "identity"}),
+        ("cached gzip", cached, {"Accept-Encoding": "gzip"}),
+        ("cached br", cached, {"Accept-Encoding": "br, gzip"}),
+        ("cached 304", cached, {"Accept-Encoding": "br, gzip", "If-None-Match": etag}),
+    ]
+    print("handler only:")
+    for label, host, headers in cases:
+        rps = asyncio.run(asgi_rate(apps["legacy" if host == legacy else "cached"], headers, args.duration / 2))
+        print(f"{label:>24}: {rps:8.0f} req/s")
+    print(f"over HTTP, {args.concurrency} connections:")
+    for label, host, headers in cases:
+        rps, size = asyncio.run(hammer(host, headers, args.duration, args.concurrency))
+        print(f"{label:>24}: {rps:8.1f} req/s  {size / 1024:6.1f} KiB/response")
+
+
+if __name__ == "__main__":
+    main()
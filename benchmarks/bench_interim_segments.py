@@ -0,0 +1,53 @@
+"""Rule extraction over growing interim transcripts: incremental suffix scan vs full rescan.
+
+    python -m benchmarks.bench_interim_segments --words 10,40,120
+"""
+import argparse
+import time
+
+from app.services.fast_extract import scan
+from app.services.transcript_segments import SegmentTracker
+
+DICTATION = (
+    "patient name is ravi kumar 45 years male complaining of fever and cough since three days "
+    "with sore throat and mild headache advise cbc and x-ray chest paracetamol 500 mg twice daily "
+)
+
+
+def interims(n_words: int) -> list:
+    words = (DICTATION * (n_words // len(DICTATION.split()) + 1)).split()[:n_words]
+    return [" ".join(words[:i]) for i in range(1, n_words + 1)]
+
+
+def run_full(texts: list) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        scan(text)
+    return time.perf_counter() - start
+
+
+def run_incremental(texts: list):
+    tracker = SegmentTracker()
+    start = time.perf_counter()
+    for text in texts:
+        tracker.interim_update("seg", text)
+    return time.perf_counter() - start, tracker
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--words", default="10,40,120")
+    args = parser.parse_args()
+    for n in (int(w) for w in args.words.split(",")):
+        texts = interims(n)
+        full = run_full(texts)
+        inc, tracker = run_incremental(texts)
+        print(
+            f"{n:4d} words, {len(texts)} interims: full rescan {full * 1000:7.2f} ms "
+            f"({tracker.full_chars} chars) | incremental {inc * 1000:6.2f} ms "
+            f"({tracker.scanned_chars} chars) | per interim {inc / len(texts) * 1e6:5.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Lexicon lookup latency and resident memory: mmap'd deletion index vs an in-memory dict.
+
+    python -m benchmarks.bench_lexicon --entries 100000
+"""
+import argparse
+import gc
+import os
+import random
+import string
+import tempfile
+import time
+
+from app.services.lexicon import Lexicon, _variants, build_index, within_one_edit
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_entries(n: int) -> list:
+    rng = random.Random(n)
+    terms = {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 14))) for _ in range(n)}
+    return [("drug", term, term[:4] + "generic") for term in sorted(terms)]
+
+
+def typo(term: str, rng: random.Random) -> str:
+    i = rng.randrange(len(term))
+    return term[:i] + rng.choice(string.ascii_lowercase) + term[i + 1:]
+
+
+def per_call_us(fn, queries: list) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def dict_index(entries: list) -> dict:
+    index = {}
+    for entry in entries:
+        for variant in _variants(entry[1]):
+            index.setdefault(variant, []).append(entry)
+    return index
+
+
+def dict_lookup(index: dict, token: str):
+    for variant in _variants(token):
+        for kind, term, canonical in index.get(variant, ()):
+            if term == token or within_one_edit(term, token):
+                return kind, term, canonical
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+
+    entries = synthetic_entries(args.entries)
+    rng = random.Random(0)
+    sample = [rng.choice(entries)[1] for _ in range(args.queries)]
+    exact, fuzzy = sample, [typo(t, rng) for t in sample]
+    misses = ["".join(rng.choices(string.ascii_lowercase, k=8)) for _ in range(args.queries)]
+
+    path = os.path.join(tempfile.gettempdir(), f"bench-lexicon-{args.entries}.idx")
+    start = time.perf_counter()
+    build_index(entries, path)
+    print(f"{len(entries)} entries: build {time.perf_counter() - start:.1f} s, index {os.path.getsize(path) / 2**20:.1f} MiB")
+
+    gc.collect()
+    base = rss_mb()
+    lexicon = Lexicon(path)
+    print(f"mmap index: +{rss_mb() - base:.1f} MiB after open", end="")
+    results = {name: per_call_us(lexicon._lookup, qs) for name, qs in (("exact", exact), ("fuzzy", fuzzy), ("miss", misses))}
+    print(f", +{rss_mb() - base:.1f} MiB after {3 * args.queries} lookups")
+    print("  " + "  ".join(f"{k} {v:.1f} us" for k, v in results.items()))
+    hits = sum(1 for q in fuzzy if lexicon._lookup(q))
+    print(f"  one-edit typos resolved: {hits}/{len(fuzzy)}")
+    lexicon.close()
+
+    gc.collect()
+    base = rss_mb()
+    index = dict_index(entries)
+    print(f"dict index: +{rss_mb() - base:.1f} MiB")
+    print("  " + "  ".join(
+        f"{name} {per_call_us(lambda q: dict_lookup(index, q), qs):.1f} us"
+        for name, qs in (("exact", exact), ("fuzzy", fuzzy), ("miss", misses))
+    ))
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
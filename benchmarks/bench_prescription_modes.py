@@ -0,0 +1,56 @@
+"""End-to-end /analyze-prescription latency: fused single call vs two sequential calls.
+
+    python -m benchmarks.bench_prescription_modes --uploads 10 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_llm import EXTRACTION_REPLY, MockLLMServer
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+FUSED_REPLY = json.dumps({"analysis": "## Prescription\n- Paracetamol 500 mg", "extracted_data": json.loads(EXTRACTION_REPLY)})
+
+
+async def measure(app, uploads: int) -> list:
+    data = FIXTURE.read_bytes()
+    timings = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for _ in range(uploads):
+            start = time.perf_counter()
+            resp = await client.post(
+                "/analyze-prescription",
+                files={"file": ("pms.jpg", data, "image/jpeg")},
+                headers={"X-Cache-Bypass": "1"},
+            )
+            resp.raise_for_status()
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    os.environ.update(OPENAI_API_KEY="mock", OPENAI_MODEL="mock", ANALYSIS_CACHE_PATH="")
+    import main as server_main
+    from app.services.openai_client import OpenAIClient
+
+    for mode, reply, fused in (("two_call", EXTRACTION_REPLY, "0"), ("fused", FUSED_REPLY, "1")):
+        server = MockLLMServer(latency=args.latency, reply=reply).start_in_thread()
+        os.environ.update(OPENAI_BASE_URL=server.base_url, PRESCRIPTION_FUSED=fused)
+        server_main.app.state.ai_client = OpenAIClient()
+        timings = asyncio.run(measure(server_main.app, args.uploads))
+        print(f"{mode:>9}: llm_calls={server.requests:3d} p50={statistics.median(timings):7.1f} ms  max={max(timings):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
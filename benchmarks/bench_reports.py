@@ -0,0 +1,55 @@
+"""PDF report throughput: per-call style rebuild vs cached template, and pooled batch rendering.
+
+    python -m benchmarks.bench_reports --reports 200 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from app.services import pdf_service
+
+RECORD = {
+    "patient_name": "Ravi Kumar", "age": "45", "gender": "Male", "doctor_name": "Dr. Mehta",
+    "symptoms": ["fever", "cough", "headache"], "diagnosis": "Viral Fever",
+    "medicines": [{"name": f"Medicine {i}", "dose": "500 mg", "frequency": "Twice daily"} for i in range(6)],
+    "medical_tests": [{"name": "CBC"}, {"name": "Lipid Profile", "details": "Fasting"}],
+}
+
+
+def single(reports: int, cold: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(reports):
+        if cold:
+            pdf_service._template = None
+        pdf_service.generate_pdf(RECORD)
+    return reports / (time.perf_counter() - start)
+
+
+async def batch(reports: int) -> float:
+    records = [{**RECORD, "patient_name": f"Patient {i}"} for i in range(reports)]
+    await pdf_service.render_pdf_async(RECORD)  # spin the pool up outside the timed region
+    start = time.perf_counter()
+    size = 0
+    async for chunk in pdf_service.stream_reports_zip(records):
+        size += len(chunk)
+    return reports / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+    os.environ["REPORT_WORKERS"] = str(args.workers)
+    cold = single(args.reports // 4, cold=True)
+    warm = single(args.reports // 4, cold=False)
+    pooled = asyncio.run(batch(args.reports))
+    pdf_service.shutdown_pool()
+    print(f"single, styles rebuilt per call : {cold:7.1f} reports/s")
+    print(f"single, cached template          : {warm:7.1f} reports/s")
+    print(f"batch zip, {args.workers:>2} workers           : {pooled:7.1f} reports/s  ({pooled / args.workers:.1f} per core)")
+
+
+if __name__ == "__main__":
+    main()
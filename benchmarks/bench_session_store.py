@@ -0,0 +1,80 @@
+"""Cost of persisting voice-session patches: write-behind batches vs a commit per patch.
+
+    python -m benchmarks.bench_session_store --sessions 20 --patches 50
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.session_store import SessionStore
+
+
+async def write_behind(path: str, sessions: int, patches: int, flush_interval: float):
+    store = SessionStore(path=path, flush_interval=flush_interval)
+    opened = [await store.open(f"s{i}") for i in range(sessions)]
+    start = time.perf_counter()
+    for n in range(patches):
+        for session in opened:
+            session.record.merge({"symptoms": [f"symptom {n}"]})
+            base, version, patch = session.record.take_delta()
+            store.record_patch(session, base, version, "fast", patch)
+        await asyncio.sleep(0)
+    hot = time.perf_counter() - start
+    for session in opened:
+        await store.release(session)
+    total = time.perf_counter() - start
+    stats = store.stats()
+    await store.close()
+    return hot, total, stats
+
+
+async def write_through(path: str, sessions: int, patches: int):
+    store = SessionStore(path=path)
+    opened = [await store.open(f"s{i}") for i in range(sessions)]
+    start = time.perf_counter()
+    for n in range(patches):
+        for session in opened:
+            session.record.merge({"symptoms": [f"symptom {n}"]})
+            base, version, patch = session.record.take_delta()
+            store.record_patch(session, base, version, "fast", patch)
+            await store.flush()
+    total = time.perf_counter() - start
+    await store.close()
+    return total
+
+
+async def resume(path: str, sessions: int):
+    store = SessionStore(path=path)
+    start = time.perf_counter()
+    for i in range(sessions):
+        session = await store.open(f"s{i}")
+        store.replay(session, max(1, session.record.version - 10))
+    elapsed = time.perf_counter() - start
+    await store.close()
+    return elapsed / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--patches", type=int, default=50)
+    parser.add_argument("--flush", type=float, default=0.25)
+    args = parser.parse_args()
+    total_patches = args.sessions * args.patches
+
+    with tempfile.TemporaryDirectory() as tmp:
+        hot, total, stats = asyncio.run(write_behind(os.path.join(tmp, "wb.sqlite3"), args.sessions, args.patches, args.flush))
+        print(
+            f"write-behind : {hot / total_patches * 1e6:7.1f} us/patch on the event loop, "
+            f"{total:.2f} s until durable, {stats['flushes']} transactions"
+        )
+        through = asyncio.run(write_through(os.path.join(tmp, "wt.sqlite3"), args.sessions, args.patches))
+        print(f"write-through: {through / total_patches * 1e6:7.1f} us/patch, {total_patches} transactions")
+        per_resume = asyncio.run(resume(os.path.join(tmp, "wb.sqlite3"), args.sessions))
+        print(f"cold resume from disk (another worker): {per_resume * 1000:.2f} ms/session")
+
+
+if __name__ == "__main__":
+    main()
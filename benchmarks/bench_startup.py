@@ -0,0 +1,93 @@
+"""Cold start: import time of ``main`` and time to the first responses of a fresh server process.
+
+    python -m benchmarks.bench_startup --runs 3
+    git worktree add /tmp/pms-before <rev> && python -m benchmarks.bench_startup --repo /tmp/pms-before
+
+Each run starts ``uvicorn main:app`` in a new process against the mock LLM and
+times, from process start: the first answer on ``/``, then the first report
+and the first prescription analysis, once per ``WARMUP`` mode.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_llm import DEFAULT_ROUTES, MockLLMServer
+
+ROOT = Path(__file__).resolve().parent.parent
+REPORT = {"patient_name": "Ravi Kumar", "age": "45", "symptoms": ["fever"], "medicines": [{"name": "Paracetamol", "dose": "500 mg"}]}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_seconds(repo: Path, env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=repo, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def first_responses(repo: Path, env: dict) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                            cwd=repo, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        with httpx.Client(base_url=base, timeout=60) as client:
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.01)
+                if proc.poll() is not None or time.perf_counter() - started > 60:
+                    raise RuntimeError("server did not start")
+            timings["first_page"] = time.perf_counter() - started
+            t = time.perf_counter()
+            client.post("/generate-report", json=REPORT).raise_for_status()
+            timings["first_report"] = time.perf_counter() - t
+            t = time.perf_counter()
+            files = {"file": ("pms.jpg", (ROOT / "pms.jpg").read_bytes(), "image/jpeg")}
+            client.post("/analyze-prescription", files=files, headers={"X-Cache-Bypass": "1"}).raise_for_status()
+            timings["first_analysis"] = time.perf_counter() - t
+            timings["total"] = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=str(ROOT), help="checkout to measure (default: this one)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    repo = Path(args.repo).resolve()
+    mock = MockLLMServer(latency=args.llm_latency, routes=DEFAULT_ROUTES).start_in_thread()
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    # Older checkouts insist on a key; the mock accepts any.
+    env.update(OPENAI_API_KEY="local", OPENAI_BASE_URL=mock.base_url, OPENAI_MODEL="mock", ANALYSIS_CACHE_PATH="",
+               VOICE_SESSION_PATH="", PYTHONPATH=str(repo), WARMUP="0")
+    imports = [import_seconds(repo, env) for _ in range(args.runs)]
+    print(f"{repo}: import main {statistics.median(imports) * 1000:7.1f} ms (median of {args.runs})")
+    for warmup in ("0", "background", "1"):
+        runs = [first_responses(repo, {**env, "WARMUP": warmup}) for _ in range(args.runs)]
+        line = "  ".join(f"{key}={statistics.median(r[key] for r in runs) * 1000:7.1f} ms" for key in runs[0])
+        print(f"  WARMUP={warmup:<10}: {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Time-to-first-byte vs total time for buffered and streamed analysis/chat, over real HTTP.
+
+    python -m benchmarks.bench_streaming --latency 0.4 --token-latency 0.005
+"""
+import argparse
+import asyncio
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.mock_llm import MockLLMServer
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+MARKDOWN = "## Prescription\n" + " ".join(f"- line {i}: Paracetamol 500 mg twice daily after food." for i in range(40))
+
+
+def serve(app) -> str:
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"127.0.0.1:{port}"
+
+
+async def bench(host: str):
+    data = FIXTURE.read_bytes()
+    files = {"file": ("pms.jpg", data, "image/jpeg")}
+    headers = {"X-Cache-Bypass": "1"}
+    async with httpx.AsyncClient(base_url=f"http://{host}", timeout=60) as client:
+        start = time.perf_counter()
+        resp = await client.post("/analyze-prescription", files=files, headers=headers)
+        resp.raise_for_status()
+        total = (time.perf_counter() - start) * 1000
+        print(f"{'buffered analysis':>18}: ttfb={total:7.1f} ms  total={total:7.1f} ms")
+
+        start = time.perf_counter()
+        first = None
+        async with client.stream("POST", "/analyze-prescription/stream", files=files, headers=headers) as resp:
+            async for line in resp.aiter_lines():
+                if first is None and line.startswith("event: token"):
+                    first = (time.perf_counter() - start) * 1000
+        total = (time.perf_counter() - start) * 1000
+        print(f"{'streamed analysis':>18}: ttfb={first:7.1f} ms  total={total:7.1f} ms")
+
+    import websockets
+
+    async with websockets.connect(f"ws://{host}/ws/voice-assistant") as ws:
+        start = time.perf_counter()
+        first = None
+        await ws.send("CHAT:what is the dose of paracetamol")
+        while True:
+            msg = await ws.recv()
+            if first is None and msg.startswith("CHAT_DELTA:"):
+                first = (time.perf_counter() - start) * 1000
+            if msg.startswith("CHAT_DONE:"):
+                break
+        total = (time.perf_counter() - start) * 1000
+        print(f"{'streamed chat':>18}: ttfb={first:7.1f} ms  total={total:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.4)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    args = parser.parse_args()
+    mock = MockLLMServer(latency=args.latency, token_latency=args.token_latency, reply=MARKDOWN).start_in_thread()
+    os.environ.update(OPENAI_API_KEY="mock", OPENAI_MODEL="mock", OPENAI_BASE_URL=mock.base_url,
+                      ANALYSIS_CACHE_PATH="", PRESCRIPTION_FUSED="0")
+    import main as server_main
+
+    asyncio.run(bench(serve(server_main.app)))
+
+
+if __name__ == "__main__":
+    main()
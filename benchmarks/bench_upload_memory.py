@@ -0,0 +1,101 @@
+"""Peak memory per upload: ``await file.read()`` vs chunked ``read_upload`` with spooling and caps.
+
+    python -m benchmarks.bench_upload_memory --sizes 1,8,19
+
+The request side is measured with tracemalloc around reading one UploadFile.
+The decode side runs in a fresh process per case, so ``ru_maxrss`` is that
+one image's peak RSS: a large, highly compressible PNG is decoded the old
+way and then rejected by the header-only pixel check.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from starlette.datastructures import UploadFile
+
+from app.services.upload_stream import UploadLimits, UploadRejected, read_upload
+
+
+def upload_file(size: int) -> UploadFile:
+    # What the multipart parser hands the route: a temp file spooled past 1 MB.
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(b"\xff\xd8\xff" + os.urandom(size - 3))
+    spooled.seek(0)
+    return UploadFile(spooled, size=size, filename="photo.jpg")
+
+
+async def measure(size: int, new: bool):
+    file = upload_file(size)
+    limits = UploadLimits(max_bytes=64 * 1024 * 1024)
+    tracemalloc.start()
+    started = time.perf_counter()
+    if new:
+        try:
+            upload = await read_upload(file, limits)
+            upload.close()
+        except UploadRejected:
+            pass  # random bytes behind a JPEG signature fail the header check after the full read
+    else:
+        await file.read()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await file.close()
+    return peak, elapsed
+
+
+DECODE_CASE = """
+import io, resource, sys, time
+from PIL import Image
+side = int(sys.argv[1])
+buf = io.BytesIO(); Image.new("L", (side, side), 255).save(buf, "PNG"); data = buf.getvalue()
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+started = time.perf_counter()
+if sys.argv[2] == "old":
+    from app.services.image_preprocess import prepare_image, PreprocessOptions
+    prepare_image(data, PreprocessOptions())
+    outcome = "decoded"
+else:
+    from app.services.upload_stream import UploadLimits, _check_pixels, UploadRejected
+    try:
+        _check_pixels(io.BytesIO(data), "PNG", UploadLimits())
+        outcome = "accepted"
+    except UploadRejected:
+        outcome = "rejected"
+print(len(data), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base, time.perf_counter() - started, outcome)
+"""
+
+
+def decode_case(side: int, mode: str):
+    out = subprocess.run([sys.executable, "-c", DECODE_CASE, str(side), mode], capture_output=True, text=True,
+                         env={**os.environ, "UPLOAD_MAX_PIXELS": "50000000" if mode == "new" else str(10**12)}, check=True).stdout.split()
+    return int(out[0]), int(out[1]), float(out[2]), out[3]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1,8,19", help="upload sizes in MiB")
+    parser.add_argument("--side", type=int, default=9000, help="PNG width/height for the decode case")
+    args = parser.parse_args()
+
+    print("request side (peak Python allocations while reading the upload):")
+    for mib in (float(s) for s in args.sizes.split(",")):
+        size = int(mib * 1024 * 1024)
+        old_peak, old_s = asyncio.run(measure(size, new=False))
+        new_peak, new_s = asyncio.run(measure(size, new=True))
+        print(f"  {mib:5.1f} MiB: file.read() {old_peak / 2**20:6.1f} MiB {old_s * 1000:6.1f} ms"
+              f" | read_upload {new_peak / 2**20:6.1f} MiB {new_s * 1000:6.1f} ms")
+
+    print(f"decode side ({args.side}x{args.side} PNG, fresh process each):")
+    for mode in ("old", "new"):
+        size, rss_kb, seconds, outcome = decode_case(args.side, mode)
+        print(f"  {mode}: {size / 1024:7.1f} KiB file, +{rss_kb / 1024:7.1f} MiB RSS, {seconds * 1000:8.1f} ms, {outcome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""End-to-end load test: voice websockets, prescription uploads and report generation at once.
+
+    python -m benchmarks.load_test --voice 20 --uploads 4 --reports 4 --duration 30 --out benchmarks/baselines/local.json
+    python -m benchmarks.load_test --compare benchmarks/baselines/local.json
+
+Without ``--target`` the app is started in-process against ``benchmarks.mock_llm``,
+so no API key or network is needed. Each endpoint gets count, errors,
+throughput and p50/p95/p99 latency; ``--out`` saves them as a JSON baseline
+and ``--compare`` prints the change against an earlier one.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from pathlib import Path
+
+import httpx
+import websockets
+
+from benchmarks.mock_llm import DEFAULT_ROUTES, MockLLMServer
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+DOCTORS = ["sharma", "mehta", "iyer", "khan", "rao", "das"]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name: str):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, duration: float) -> dict:
+        out = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            values = sorted(self.samples.get(name, []))
+            out[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": percentile_ms(values, 50),
+                "p95_ms": percentile_ms(values, 95),
+                "p99_ms": percentile_ms(values, 99),
+                "max_ms": round(values[-1] * 1000, 2) if values else None,
+            }
+        return out
+
+
+def percentile_ms(values: list, pct: float):
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, int(round(pct / 100 * len(values) + 0.5)) - 1))
+    return round(values[rank] * 1000, 2)
+
+
+def utterance(k: int) -> tuple:
+    """Every utterance changes the age (a fast PATCH); every other one also needs the model."""
+    text = f"age {k % 90 + 1} years"
+    if k % 2:
+        return text + f", seen by doctor {DOCTORS[k % len(DOCTORS)]}, advised rest and fluids {k}", True
+    return text, False
+
+
+async def voice_client(host: str, index: int, run_id: str, stop_at: float, interval: float, rec: Recorder):
+    fast = asyncio.Queue()
+    ai_sent = []
+
+    async def reader(ws):
+        async for message in ws:
+            if not message.startswith("PATCH:"):
+                continue
+            patch = json.loads(message[6:])
+            if patch.get("src") == "fast":
+                fast.put_nowait(time.perf_counter())
+            elif ai_sent:
+                # Utterances are coalesced upstream; one AI patch answers everything sent before it.
+                rec.add("ws_ai_patch", time.perf_counter() - ai_sent[0])
+                ai_sent.clear()
+
+    try:
+        started = time.perf_counter()
+        async with websockets.connect(f"ws://{host}/ws/voice-assistant?session={run_id}-{index}", max_size=None) as ws:
+            await ws.recv()
+            rec.add("ws_connect", time.perf_counter() - started)
+            task = asyncio.create_task(reader(ws))
+            k = index * 1000
+            while time.perf_counter() < stop_at:
+                text, needs_llm = utterance(k)
+                k += 1
+                sent = time.perf_counter()
+                if needs_llm and not ai_sent:
+                    ai_sent.append(sent)
+                await ws.send(text)
+                try:
+                    rec.add("ws_fast_patch", await asyncio.wait_for(fast.get(), 10) - sent)
+                except asyncio.TimeoutError:
+                    rec.error("ws_fast_patch")
+                await asyncio.sleep(interval)
+            task.cancel()
+    except Exception:
+        rec.error("ws_connect")
+
+
+async def upload_worker(client: httpx.AsyncClient, stop_at: float, cache: bool, rec: Recorder):
+    data = FIXTURE.read_bytes()
+    headers = {} if cache else {"X-Cache-Bypass": "1"}
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        try:
+            resp = await client.post("/analyze-prescription", files={"file": ("pms.jpg", data, "image/jpeg")}, headers=headers)
+            ok = resp.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            rec.add("analyze_prescription", time.perf_counter() - started)
+        else:
+            rec.error("analyze_prescription")
+
+
+async def report_worker(client: httpx.AsyncClient, index: int, stop_at: float, rec: Recorder):
+    n = 0
+    while time.perf_counter() < stop_at:
+        n += 1
+        body = {
+            "patient_name": f"Patient {index}-{n}",
+            "age": str(n % 90 + 1),
+            "symptoms": ["fever", "cough"],
+            "medicines": [{"name": "Paracetamol", "dose": "500 mg", "frequency": "Twice daily"}],
+            "medical_tests": [{"name": "CBC"}],
+        }
+        started = time.perf_counter()
+        try:
+            resp = await client.post("/generate-report", json=body)
+            ok = resp.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        if ok:
+            rec.add("generate_report", time.perf_counter() - started)
+        else:
+            rec.error("generate_report")
+
+
+async def run(host: str, args) -> dict:
+    rec = Recorder()
+    run_id = f"load-{int(time.time())}"
+    limits = httpx.Limits(max_connections=args.uploads + args.reports + 4)
+    async with httpx.AsyncClient(base_url=f"http://{host}", timeout=120, limits=limits) as client:
+        started = time.perf_counter()
+        stop_at = started + args.duration
+        await asyncio.gather(
+            *(voice_client(host, i, run_id, stop_at, args.interval, rec) for i in range(args.voice)),
+            *(upload_worker(client, stop_at, args.cache, rec) for _ in range(args.uploads)),
+            *(report_worker(client, i, stop_at, rec) for i in range(args.reports)),
+        )
+        elapsed = time.perf_counter() - started
+    return rec.summary(elapsed)
+
+
+def start_local(args) -> tuple:
+    mock = MockLLMServer(
+        latency=args.llm_latency, jitter=args.llm_jitter, token_latency=args.token_latency,
+        routes=DEFAULT_ROUTES, error_rate=args.error_rate, error_status=503,
+    ).start_in_thread()
+    os.environ.update(
+        OPENAI_BASE_URL=mock.base_url,
+        OPENAI_MODEL=os.getenv("OPENAI_MODEL") or "mock",
+        VOICE_SESSION_PATH="",
+        ANALYSIS_CACHE_PATH="",
+    )
+    os.environ.pop("OPENAI_API_KEY", None)
+    import main
+    from benchmarks.bench_streaming import serve
+
+    return serve(main.app), mock
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_results(results: dict, baseline: dict = None):
+    print(f"{'endpoint':22} {'count':>6} {'err':>4} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, r in results.items():
+        line = f"{name:22} {r['count']:6d} {r['errors']:4d} {r['rps']:8.2f} " + " ".join(
+            f"{r[k]:9.1f}" if r[k] is not None else f"{'-':>9}" for k in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        old = (baseline or {}).get(name)
+        if old and old.get("p95_ms") and r["p95_ms"] is not None and old.get("rps"):
+            line += f"   p95 {(r['p95_ms'] / old['p95_ms'] - 1) * 100:+6.1f}%  rps {(r['rps'] / old['rps'] - 1) * 100:+6.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", help="host:port of a running server; default starts one against the mock LLM")
+    parser.add_argument("--voice", type=int, default=10, help="concurrent voice websockets")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between utterances per websocket")
+    parser.add_argument("--uploads", type=int, default=2, help="concurrent prescription upload loops")
+    parser.add_argument("--reports", type=int, default=2, help="concurrent report generation loops")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--cache", action="store_true", help="let uploads hit the analysis cache")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--llm-jitter", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock LLM calls that return 503")
+    parser.add_argument("--out", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="earlier baseline to diff against")
+    args = parser.parse_args()
+
+    mock = None
+    host = args.target
+    if not host:
+        host, mock = start_local(args)
+    results = asyncio.run(run(host, args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    if mock is not None:
+        print(f"mock LLM: {mock.requests} requests, {mock.errors} injected errors")
+    if args.out:
+        config = {k: v for k, v in vars(args).items() if k not in ("out", "compare")}
+        report = {
+            "meta": {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "revision": git_revision(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "config": config,
+            },
+            "results": results,
+        }
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
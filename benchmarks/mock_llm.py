@@ -0,0 +1,240 @@
+"""Local stand-in for the OpenAI chat-completions endpoint.
+
+    python -m benchmarks.mock_llm --port 8001 --latency 0.3 --error-rate 0.05
+
+then start the app with ``OPENAI_BASE_URL=http://127.0.0.1:8001/v1``.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+EXTRACTION_REPLY = json.dumps({
+    "patient_name": "Ravi Kumar",
+    "age": "45",
+    "gender": "Male",
+    "symptoms": ["fever", "cough"],
+    "medicines": [{"name": "Paracetamol", "dose": "500 mg", "frequency": "Twice daily"}],
+    "medical_tests": [{"name": "CBC"}],
+})
+ANALYSIS_REPLY = (
+    "## Prescription\n- **Patient:** Ravi Kumar\n- **Doctor:** Dr. Sharma\n"
+    "- Paracetamol 500 mg, twice daily after food for 5 days\n- Azithromycin 500 mg, once daily for 3 days\n"
+)
+FUSED_REPLY = json.dumps({"analysis": ANALYSIS_REPLY, "extracted_data": json.loads(EXTRACTION_REPLY)})
+CHAT_REPLY = "Rest, fluids and paracetamol for the fever. This is not a diagnosis; please consult a qualified doctor."
+
+# (pattern searched in the request's prompt text, reply). ``{input}`` in a reply is replaced by the
+# JSON-escaped tail of the last user message, so repeated calls still change the record.
+DEFAULT_ROUTES = (
+    (r"Return ONLY a JSON object with two keys", FUSED_REPLY),
+    (r"Extract structured medical details", EXTRACTION_REPLY[:-1] + ', "notes": ["{input}"]}'),
+    (r"Analyze this prescription", ANALYSIS_REPLY),
+    (r"", CHAT_REPLY),
+)
+
+
+def completion_body(content: str, prompt_tokens: int = 100) -> bytes:
+    completion_tokens = len(content.split())
+    return json.dumps({
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "mock",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }).encode()
+
+
+def prompt_text(payload: dict) -> str:
+    parts = []
+    for message in payload.get("messages") or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        elif isinstance(content, list):
+            parts.extend(p.get("text", "") for p in content if isinstance(p, dict))
+    return "\n".join(parts)
+
+
+class MockLLMServer:
+    """Minimal keep-alive HTTP/1.1 stand-in for the chat-completions endpoint.
+
+    ``latency`` (plus up to ``jitter``) delays every response and each word of
+    the reply costs another ``token_latency`` seconds, emitted as it goes for
+    ``"stream": true`` requests and all at once otherwise. ``reply`` answers
+    every request unless ``routes`` is given, in which case the first pattern
+    found in the prompt picks the reply. A fraction ``error_rate`` of requests
+    fail with ``error_status`` (and ``Retry-After`` when ``retry_after`` is set).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.2, reply: str = EXTRACTION_REPLY,
+                 token_latency: float = 0.0, routes=None, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, retry_after: float = None, seed: int = 0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_latency = token_latency
+        self.reply = reply
+        self.routes = [(re.compile(p), r) for p, r in routes] if routes else None
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._server = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    def choose_reply(self, payload: dict) -> str:
+        if not self.routes:
+            return self.reply
+        text = prompt_text(payload)
+        for pattern, reply in self.routes:
+            if pattern.search(text):
+                if "{input}" in reply:
+                    tail = text.rsplit("User input:", 1)[-1].strip()[-120:]
+                    reply = reply.replace("{input}", json.dumps(tail)[1:-1])
+                return reply
+        return self.reply
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.decode("latin-1").split("\r\n")[1:]:
+                    name, _, value = line.partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value.strip())
+                body = await reader.readexactly(length) if length else b"{}"
+                self.requests += 1
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    payload = {}
+                await asyncio.sleep(self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0))
+                if self.error_rate and self._rng.random() < self.error_rate:
+                    self.errors += 1
+                    self._error(writer)
+                    await writer.drain()
+                    continue
+                reply = self.choose_reply(payload)
+                prompt_tokens = len(body) // 4
+                if payload.get("stream"):
+                    include_usage = (payload.get("stream_options") or {}).get("include_usage")
+                    await self._stream(writer, reply, prompt_tokens if include_usage else None)
+                    continue
+                if self.token_latency:
+                    await asyncio.sleep(self.token_latency * len(reply.split()))
+                body = completion_body(reply, prompt_tokens)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    def _error(self, writer):
+        body = json.dumps({"error": {"message": "injected failure", "type": "mock_error", "code": self.error_status}}).encode()
+        extra = f"Retry-After: {self.retry_after}\r\n" if self.retry_after is not None else ""
+        writer.write(
+            f"HTTP/1.1 {self.error_status} Mock Error\r\nContent-Type: application/json\r\n{extra}"
+            f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+
+    async def _stream(self, writer, reply: str, prompt_tokens: int = None):
+        def chunk(data: bytes) -> bytes:
+            return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+        def event(choices, **extra) -> bytes:
+            data = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": "mock", "choices": choices, **extra}
+            return chunk(b"data: " + json.dumps(data).encode() + b"\n\n")
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        pieces = re.findall(r"\S+\s*", reply)
+        for piece in pieces:
+            writer.write(event([{"index": 0, "delta": {"content": piece}, "finish_reason": None}]))
+            await writer.drain()
+            await asyncio.sleep(self.token_latency)
+        if prompt_tokens is not None:
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces), "total_tokens": prompt_tokens + len(pieces)}
+            writer.write(event([], usage=usage))
+        writer.write(chunk(b"data: [DONE]\n\n") + b"0\r\n\r\n")
+        await writer.drain()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def start_in_thread(self):
+        """Run the server on its own loop so blocking clients can be benchmarked against it."""
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.start())
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self
+
+
+def load_routes(path: str):
+    """Routes from a JSON file: ``[{"match": "<regex>", "reply": "<text>" or {json object}}, ...]``."""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+    return [(e.get("match", ""), e["reply"] if isinstance(e["reply"], str) else json.dumps(e["reply"])) for e in entries]
+
+
+async def serve_forever(server: MockLLMServer):
+    await server.start()
+    print(f"mock LLM listening; export OPENAI_BASE_URL={server.base_url}", flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--routes", help="JSON file of {match, reply} entries; defaults to the built-in replies")
+    args = parser.parse_args()
+    server = MockLLMServer(
+        host=args.host, port=args.port, latency=args.latency, token_latency=args.token_latency,
+        routes=load_routes(args.routes) if args.routes else DEFAULT_ROUTES, jitter=args.jitter,
+        error_rate=args.error_rate, error_status=args.error_status, retry_after=args.retry_after,
+    )
+    try:
+        asyncio.run(serve_forever(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
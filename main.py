@@ -1,9 +1,41 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.services.openai_client import OpenAIClient
+from app.services import image_preprocess, pdf_service
+from app.services.analysis_cache import AnalysisCache
+from app.services.report_cache import ReportCache
+from app.services.session_store import SessionStore
+from app.services.static_page import StaticPage
+from app.services.metrics import REGISTRY, MetricsMiddleware
+from app.services.upload_stream import UploadLimitMiddleware
+from app.services.warmup import warm_up, warmup_mode
 from app.api.routes import root, prescription, voice, report
 
-app = FastAPI(title="PMS AI - Prescription & Voice Assistant")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        app.state.index_page.load()
+    except OSError as e:
+        print(f"Warning: index page not loaded. {e}")
+    warming = None
+    mode = warmup_mode()
+    if mode == "blocking":
+        await warm_up(app)
+    elif mode == "background":
+        warming = asyncio.create_task(warm_up(app))
+    yield
+    if warming is not None and not warming.done():
+        warming.cancel()
+    if app.state.ai_client:
+        await app.state.ai_client.aclose()
+    image_preprocess.shutdown_pool()
+    pdf_service.shutdown_pool()
+    app.state.analysis_cache.close()
+    await app.state.session_store.close()
+
+app = FastAPI(title="PMS AI - Prescription & Voice Assistant", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -14,6 +46,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Initialize OpenAI Client safely
 try:
     ai_client = OpenAIClient()
@@ -22,6 +57,18 @@ except Exception as e:
     ai_client = None
 # expose client to routers
 app.state.ai_client = ai_client
+app.state.analysis_cache = AnalysisCache.from_env()
+app.state.report_cache = ReportCache.from_env()
+app.state.session_store = SessionStore.from_env()
+app.state.index_page = StaticPage.from_env()
+
+REGISTRY.register_stats("analysis_cache", app.state.analysis_cache.stats)
+REGISTRY.register_stats("report_cache", app.state.report_cache.stats)
+REGISTRY.register_stats("voice_sessions", app.state.session_store.stats)
+REGISTRY.register_stats("index_page", app.state.index_page.stats)
+if ai_client:
+    REGISTRY.register_stats("llm_scheduler", ai_client.scheduler.stats)
+    REGISTRY.register_stats("chat_sessions", ai_client.chat_sessions.stats)
 
 
 app.include_router(root.router)
@@ -31,4 +78,4 @@ app.include_router(report.router)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, ws_per_message_deflate=True)
@@ -0,0 +1,46 @@
+import asyncio
+
+from app.services.analysis_cache import AnalysisCache
+
+
+def test_leaving_requester_does_not_cancel_coalesced_waiters():
+    async def main():
+        cache = AnalysisCache()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"analysis": "ok"}
+
+        first = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_or_compute("k", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == ({"analysis": "ok"}, "COALESCED")
+        assert first.cancelled()
+        assert await cache.get_or_compute("k", compute) == ({"analysis": "ok"}, "HIT")
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached():
+    async def main():
+        cache = AnalysisCache()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+        assert await cache.get("k") is None
+
+    asyncio.run(main())
+
+
+def test_disk_tier_is_opt_in(monkeypatch):
+    monkeypatch.delenv("ANALYSIS_CACHE_PATH", raising=False)
+    assert AnalysisCache.from_env()._db is None
@@ -0,0 +1,58 @@
+import io
+import asyncio
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app.services.prescription_pipeline import archive_members
+from app.services.upload_stream import UploadLimits, UploadRejected, UploadTooLarge, UnsupportedUpload
+
+
+def png(width, height) -> bytes:
+    buf = io.BytesIO()
+    Image.new("L", (width, height)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def archive(**members) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+def load(members, name):
+    return asyncio.run(dict(members)[name]())
+
+
+def test_archive_members_get_the_single_upload_checks():
+    limits = UploadLimits(max_bytes=200_000, max_pixels=1_000_000)
+    members = archive_members(archive(**{
+        "ok.png": png(100, 100),
+        "bomb.bmp": b"BM" + bytes(10_000_000),
+        "big.png": png(100, 100) + bytes(300_000),
+        "huge.png": png(2000, 2000),
+        "fake.jpg": b"not an image at all",
+        "notes.txt": b"skipped",
+    }), limits)
+    assert sorted(name for name, _ in members) == ["big.png", "bomb.bmp", "fake.jpg", "huge.png", "ok.png"]
+    upload = load(members, "ok.png")
+    assert (upload.format, upload.width, upload.height) == ("PNG", 100, 100)
+    for name, error in (("bomb.bmp", UploadTooLarge), ("big.png", UploadTooLarge), ("huge.png", UploadTooLarge),
+                        ("fake.jpg", UnsupportedUpload)):
+        with pytest.raises(error):
+            load(members, name)
+
+
+def test_lying_member_size_is_still_capped():
+    limits = UploadLimits(max_bytes=50_000)
+    data = bytearray(archive(**{"scan.png": png(10, 10) + bytes(60_000)}))
+    # Rewrite the uncompressed size in the central directory to something small.
+    central = data.rfind(b"PK\x01\x02")
+    data[central + 24:central + 28] = (1000).to_bytes(4, "little")
+    (name, loader), = archive_members(bytes(data), limits)
+    with pytest.raises(UploadRejected):
+        asyncio.run(loader())
+
@@ -0,0 +1,28 @@
+from app.services.chat_sessions import ChatSessionStore, estimate_tokens
+
+
+def budget_used(store, prompt):
+    return estimate_tokens(store.system_prompt) + sum(estimate_tokens(m["content"]) for m in prompt[1:])
+
+
+def test_history_is_trimmed_in_exchanges_and_reserves_the_reply():
+    store = ChatSessionStore("sys", token_budget=200)
+    for i in range(10):
+        store.messages("s", f"question {i} " + "x" * 100)
+        store.append("s", "assistant", f"answer {i} " + "y" * 100)
+    prompt = store.messages("s", "latest question", reserve=100)
+    assert prompt[1]["role"] == "user"
+    assert prompt[-1] == {"role": "user", "content": "latest question"}
+    assert [m["role"] for m in prompt[1:-1]] == ["user", "assistant"] * ((len(prompt) - 2) // 2)
+    assert budget_used(store, prompt) + 100 <= 200
+
+
+def test_oversized_question_is_truncated_not_dropped():
+    store = ChatSessionStore("sys", token_budget=200)
+    store.messages("s", "earlier")
+    store.append("s", "assistant", "reply")
+    prompt = store.messages("s", "long question " + "z" * 2000, reserve=100)
+    assert len(prompt) == 2
+    assert prompt[1]["role"] == "user" and prompt[1]["content"].startswith("long question")
+    assert budget_used(store, prompt) + 100 <= 200
+    assert store.stats()["resident_chars"] == len(prompt[1]["content"])
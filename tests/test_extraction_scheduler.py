@@ -0,0 +1,32 @@
+import asyncio
+
+from app.services.extraction_scheduler import ExtractionScheduler
+
+
+def test_text_queued_behind_a_call_is_bounded():
+    async def main():
+        release = asyncio.Event()
+        prompts = []
+
+        async def extract(text):
+            prompts.append(text)
+            await release.wait()
+            return {}
+
+        async def on_update(seq, data):
+            pass
+
+        scheduler = ExtractionScheduler(extract, on_update, debounce=0.01, max_batch=8, max_chars=500)
+        scheduler.submit("first")
+        await asyncio.sleep(0.05)
+        for i in range(200):
+            scheduler.submit(f"utterance number {i:03d}")
+        assert len(scheduler._pending) <= 8
+        assert sum(map(len, scheduler._pending)) <= 500
+        assert scheduler.dropped_chars > 0
+        release.set()
+        await scheduler.drain()
+        assert len(prompts[-1]) <= 500 + 8
+        assert prompts[-1].endswith("utterance number 199")
+
+    asyncio.run(main())
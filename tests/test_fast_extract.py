@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.fast_extract import quick_extract, scan
+from app.services.lexicon import get_lexicon
+
+
+@pytest.mark.parametrize("word", ["along", "among", "david", "creator", "colic", "metal", "mental"])
+def test_ordinary_words_are_not_drugs(word):
+    hit = get_lexicon().lookup(word)
+    assert hit is None or hit[0] == "word"
+
+
+@pytest.mark.parametrize("text", [
+    "paracetamol 500 mg twice daily along with warm water",
+    "among the tablets continue crocin 500 mg",
+    "david has fever since 2 days, paracetamol 500 mg",
+    "the creator of this plan said tab dolo 650 twice daily",
+])
+def test_no_phantom_medicines(text):
+    generics = {m.get("generic", m["name"]) for m in scan(text)[0].get("medicines", [])}
+    assert generics <= {"Paracetamol"}
+
+
+def test_short_brand_needs_exact_spelling():
+    assert get_lexicon().lookup("amlong")[3] == 0
+    assert "Amlong" not in {m["name"] for m in scan("amlng 5 mg once daily")[0].get("medicines", [])}
+
+
+def test_fuzzy_hit_next_to_dose_is_kept():
+    medicines = scan("tab paracetmol 500 mg twice daily")[0]["medicines"]
+    assert medicines == [{"name": "Paracetamol", "dose": "500 mg", "frequency": "Twice daily"}]
+
+
+def test_two_brands_of_one_generic_stay_separate():
+    medicines = quick_extract("tab dolo 650 1-0-1 for 3 days and crocin sos", {})["medicines"]
+    assert medicines == [
+        {"name": "Dolo", "dose": "650 mg", "frequency": "1-0-1", "generic": "Paracetamol", "duration": "3 Days"},
+        {"name": "Crocin", "dose": None, "frequency": "As needed", "generic": "Paracetamol"},
+    ]
+
+
+def test_fuzzy_hit_away_from_dose_is_dropped():
+    assert "medicines" not in scan("paracetmol was discussed, follow up in a week")[0]
+
+
+@pytest.mark.parametrize("text, name", [
+    ("patient name is ravi and he has chest tightness", "Ravi"),
+    ("patient name is ravi kumar age 45 years male", "Ravi Kumar"),
+    ("name is Ravi Kumar, fever since 2 days", "Ravi Kumar"),
+])
+def test_name_capture_stops_at_filler(text, name):
+    assert scan(text)[0]["patient_name"] == name
+
+
+def test_unexplained_words_after_a_name_keep_coverage_low():
+    # "chest tightness" is not a known symptom, so the LLM must still see the utterance.
+    assert scan("patient name is ravi and he has chest tightness")[1].score < 0.8
+
+
+def test_interim_label_without_value():
+    assert "patient_name" not in scan("patient name is")[0]
+
+
+def test_diagnosis_capture():
+    assert scan("diagnosis: viral fever and rest for 3 days")[0]["diagnosis"] == "Viral Fever"
@@ -0,0 +1,85 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError
+
+from app.services.llm_scheduler import CircuitOpenError, LLMScheduler
+
+REQUEST = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+
+
+def scheduler() -> LLMScheduler:
+    return LLMScheduler(max_retries=0, breaker_threshold=1, breaker_cooldown=0.0)
+
+
+async def fail():
+    raise APIConnectionError(request=REQUEST)
+
+
+def test_stream_probe_closes_half_open_breaker():
+    async def main():
+        s = scheduler()
+        with pytest.raises(APIConnectionError):
+            await s.run(fail)
+        assert s.state == "open"
+        async with s.slot():
+            assert s.state == "half_open"
+        assert s.state == "closed"
+        async with s.slot():
+            pass
+
+    asyncio.run(main())
+
+
+def test_stream_failures_trip_the_breaker():
+    async def main():
+        s = LLMScheduler(breaker_threshold=1, breaker_cooldown=60)
+        with pytest.raises(APIConnectionError):
+            async with s.slot():
+                await fail()
+        assert s.state == "open"
+        with pytest.raises(CircuitOpenError):
+            async with s.slot():
+                pass
+
+    asyncio.run(main())
+
+
+def test_abandoned_stream_releases_the_probe():
+    async def main():
+        s = scheduler()
+        with pytest.raises(APIConnectionError):
+            await s.run(fail)
+
+        async def stream():
+            async with s.slot():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(stream())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        async with s.slot():
+            pass
+        assert s.state == "closed"
+
+    asyncio.run(main())
+
+
+def test_run_retries_connection_errors():
+    async def main():
+        s = LLMScheduler(max_retries=2, backoff_base=0.001)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 2:
+                await fail()
+            return "ok"
+
+        assert await s.run(flaky) == "ok"
+        assert s.retries == 1 and s.failures == 1 and s.state == "closed"
+
+    asyncio.run(main())
@@ -0,0 +1,12 @@
+from app.services.patient_record import PatientRecord
+
+
+def test_nameless_medicines_and_tests_are_dropped():
+    record = PatientRecord()
+    update = {"medicines": [{"dose": "500 mg"}, {"name": "  ", "frequency": "daily"}, {"name": "Paracetamol"}],
+              "medical_tests": [{"name": None}]}
+    assert record.merge(update) == {"medicines"}
+    assert record.take_delta()[2] == {"medicines": [{"name": "Paracetamol"}]}
+    assert record.merge(update) == set()
+    assert record.to_dict()["medicines"] == [{"name": "Paracetamol"}]
+    assert record.to_dict()["medical_tests"] == []
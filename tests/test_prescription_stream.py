@@ -0,0 +1,66 @@
+import asyncio
+import json
+from pathlib import Path
+
+import httpx
+
+import main
+from app.services.analysis_cache import AnalysisCache
+
+FIXTURE = Path(__file__).resolve().parent.parent / "pms.jpg"
+
+
+class StreamingClient:
+    model = "m"
+    fused_prescription = False
+
+    def __init__(self):
+        self.streams = 0
+
+    async def aclose(self):
+        pass
+
+    async def astream_prescription(self, image):
+        self.streams += 1
+        for piece in ("Rx: ", "Paracetamol"):
+            await asyncio.sleep(0.05)
+            yield piece
+
+    async def aextract_patient_info(self, analysis, current):
+        return {"medicines": [{"name": "Paracetamol"}]}
+
+
+def events(body: str) -> list:
+    out = []
+    for block in body.strip().split("\n\n"):
+        event = block.split("\n")[0][len("event: "):]
+        out.append((event, json.loads(block.split("\n")[1][len("data: "):])))
+    return out
+
+
+def test_identical_streamed_uploads_share_one_analysis(monkeypatch):
+    ai_client = StreamingClient()
+    cache = AnalysisCache()
+    monkeypatch.setattr(main.app.state, "ai_client", ai_client)
+    monkeypatch.setattr(main.app.state, "analysis_cache", cache)
+    data = FIXTURE.read_bytes()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://t", timeout=30) as client:
+            async def post():
+                resp = await client.post("/analyze-prescription/stream", files={"file": ("a.jpg", data, "image/jpeg")})
+                return events(resp.text)
+
+            first = asyncio.create_task(post())
+            await asyncio.sleep(0.02)
+            second = asyncio.create_task(post())
+            return await first, await second, await post()
+
+    first, second, third = asyncio.run(run())
+    assert ai_client.streams == 1
+    assert [e for e, _ in first] == ["token", "token", "result"]
+    assert [e for e, _ in second] == ["token", "result"]
+    assert second[0][1]["text"] == "Rx: Paracetamol"
+    assert first[-1][1] == second[-1][1] == third[-1][1]
+    stats = cache.stats()
+    assert (stats["coalesced"], stats["hits"]) == (1, 1)
@@ -0,0 +1,18 @@
+from datetime import date, datetime
+
+from app.services import report_cache
+from app.services.report_cache import ReportCache
+
+
+def test_pins_and_pdfs_expire_with_the_day(monkeypatch):
+    cache = ReportCache()
+    monkeypatch.setattr(report_cache, "_today", lambda: date(2026, 3, 1))
+    stamp = cache.pin("k", datetime(2026, 3, 1, 9, 30))
+    cache.put("k", ReportCache.etag("k", stamp), b"pdf")
+    assert cache.pin("k", datetime(2026, 3, 1, 18, 0)) == stamp
+    assert cache.get("k") is not None
+
+    monkeypatch.setattr(report_cache, "_today", lambda: date(2026, 3, 2))
+    assert cache.get("k") is None
+    assert cache.stats()["bytes"] == 0
+    assert cache.pin("k", datetime(2026, 3, 2, 10, 0)) == datetime(2026, 3, 2, 10, 0)
@@ -0,0 +1,6 @@
+from app.services.session_store import SessionStore
+
+
+def test_disk_tier_is_opt_in(monkeypatch):
+    monkeypatch.delenv("VOICE_SESSION_PATH", raising=False)
+    assert SessionStore.from_env()._db is None
@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from app.services.session_store import SessionStore
+
+
+class SlowChat:
+    async def aclose(self):
+        pass
+
+    async def aextract_fields(self, text):
+        return {}
+
+    async def astream_chat_response(self, text, session_id):
+        for piece in ("Take ", "rest."):
+            await asyncio.sleep(0.2)
+            yield piece
+
+
+def test_transcripts_are_not_held_behind_a_chat_reply(monkeypatch):
+    with TestClient(main.app) as client:
+        monkeypatch.setattr(main.app.state, "ai_client", SlowChat())
+        monkeypatch.setattr(main.app.state, "session_store", SessionStore())
+        with client.websocket_connect("/ws/voice-assistant?session=chat") as ws:
+            ws.receive_text()
+            ws.send_text("CHAT:what should he do?")
+            ws.send_text("age 45 years")
+            frames = [ws.receive_text()]
+            while not frames[-1].startswith("CHAT_DONE:"):
+                frames.append(ws.receive_text())
+    assert frames[0].startswith("PATCH:")
+    assert json.loads(frames[0][6:])["set"] == {"age": "45"}
+    assert json.loads(frames[-1][10:]) == {"reply": "Take rest."}
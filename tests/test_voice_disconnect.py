@@ -0,0 +1,71 @@
+import asyncio
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from app.services.extraction_scheduler import ExtractionScheduler
+from app.services.session_store import SessionStore
+
+
+class SlowExtractor:
+    def __init__(self):
+        self.calls = 0
+
+    async def aclose(self):
+        pass
+
+    async def aextract_fields(self, text):
+        self.calls += 1
+        await asyncio.sleep(0.2)
+        return {"doctor_name": "Dr Mehta"}
+
+
+def test_drain_runs_queued_text_and_waits_for_it():
+    async def main_():
+        updates = []
+
+        async def extract(text):
+            await asyncio.sleep(0.05)
+            return {"text": text}
+
+        async def on_update(seq, data):
+            updates.append((seq, data))
+
+        scheduler = ExtractionScheduler(extract, on_update, debounce=10)
+        scheduler.submit("seen by doctor mehta")
+        await scheduler.drain()
+        assert updates == [(1, {"text": "seen by doctor mehta"})]
+        assert scheduler.pending == 0
+
+    asyncio.run(main_())
+
+
+def test_extraction_lands_after_disconnect_and_is_replayed(monkeypatch):
+    extractor = SlowExtractor()
+    with TestClient(main.app) as client:
+        monkeypatch.setattr(main.app.state, "ai_client", extractor)
+        monkeypatch.setattr(main.app.state, "session_store", SessionStore())
+        with client.websocket_connect("/ws/voice-assistant?session=drain") as ws:
+            ws.receive_text()
+            ws.send_text("age 45 years, seen by doctor mehta today")
+            fast = json.loads(ws.receive_text()[len("PATCH:"):])
+            assert fast["src"] == "fast"
+            version = fast["v"]
+        deadline = time.monotonic() + 5
+        while extractor.calls == 0 or client.get("/voice-sessions/stats").json()["connected"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        with client.websocket_connect(f"/ws/voice-assistant?session=drain&v={version}") as ws:
+            ws.receive_text()
+            patches = []
+            while True:
+                frame = ws.receive_text()
+                if not frame.startswith("PATCH:"):
+                    break
+                patches.append(json.loads(frame[6:]))
+                if patches[-1]["src"] == "ai":
+                    break
+        assert patches[-1]["src"] == "ai"
+        assert patches[-1]["set"]["doctor_name"] == "Dr Mehta"
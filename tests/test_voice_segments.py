@@ -0,0 +1,27 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from app.services.session_store import SessionStore
+
+
+class NoLLM:
+    async def aclose(self):
+        pass
+
+    async def aextract_fields(self, text):
+        return {}
+
+
+def test_malformed_segments_are_ignored(monkeypatch):
+    with TestClient(main.app) as client:
+        monkeypatch.setattr(main.app.state, "ai_client", NoLLM())
+        monkeypatch.setattr(main.app.state, "session_store", SessionStore())
+        with client.websocket_connect("/ws/voice-assistant?session=seg") as ws:
+            ws.receive_text()
+            ws.send_text('SEG:{"id":"2","text":123,"final":false}')
+            ws.send_text('SEG:{"id":["x"],"text":"age 45","final":true}')
+            ws.send_text('SEG:{"id":"3","text":"age 45 years","final":true}')
+            assert json.loads(ws.receive_text()[6:])["set"] == {"age": "45"}
+            assert ws.receive_text() == 'FINAL:{"id":"3"}'